@@ -0,0 +1,179 @@
+"""
+Benchmark the solver over the problems/ corpus
+
+Sweeps every combination of engine, enabled heuristics and MRV on or off over the
+puzzles of each difficulty, and records the wall time, backtracks and search nodes of
+every solve. Results are saved as JSON and can be compared with a stored baseline:
+python bench.py --output bench.json --baseline baseline.json
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import sys
+import sudoku
+import main
+from solver import Solver
+
+# Status of a record for a puzzle file that could not be read or solved
+ERROR = 'error'
+
+
+# One benchmark configuration per combination of the swept settings
+def configurations(engines, heuristic_sets, mrv_settings, incremental=False):
+    for engine, heuristics, mrv in itertools.product(engines, heuristic_sets, mrv_settings):
+        options = {'heuristics': heuristics}
+        if incremental and engine == 'tensor':
+            options['incremental'] = True
+        yield {'engine': engine, 'heuristics': heuristics, 'mrv': mrv, 'options': options}
+
+
+# Solves one puzzle, keeping the fastest of several runs. Returns a result record.
+# A file that cannot be read or solved is recorded as a failed solve with status
+# 'error' and the message of main.solve_file.
+def run_one(task):
+    filename, config, max_backtracks, repeat, profile = task
+    solver = Solver(max_backtracks=max_backtracks, mrv=config['mrv'], profile=profile)
+    best = None
+    for _ in range(repeat):
+        _, result = main.solve_file((filename, config['engine'], config['options'], solver))
+        if isinstance(result, str):
+            best = result
+            break
+        if best is None or result.stats.seconds < best.stats.seconds:
+            best = result
+    record = {
+        'file': filename,
+        'level': main.level_of(filename),
+        'engine': config['engine'],
+        'heuristics': config['heuristics'],
+        'mrv': config['mrv'],
+    }
+    if isinstance(best, str):
+        record.update({'status': ERROR, 'error': best, 'nodes': 0, 'backtracks': 0, 'seconds': 0.0})
+    else:
+        record.update(best.as_dict())
+    return record
+
+
+# "heuristic_level N" when the heuristics are the first N+1, otherwise their names
+def heuristics_label(heuristics):
+    level = len(heuristics) - 1
+    if heuristics == sudoku.heuristic_level(level):
+        return "heuristic_level {}".format(level)
+    return "heuristics {}".format('+'.join(heuristics))
+
+
+# The line printed for each solve, in the same format as results.txt
+def result_line(record):
+    label = heuristics_label(record['heuristics'])
+    if record['status'] == 'solved':
+        return "Solved {} {} mrv {} with {} backtracks in {:.2f} sec:".format(
+            record['file'], label, record['mrv'], record['backtracks'], record['seconds'])
+    if record['status'] == ERROR:
+        return "Failed {} {} mrv {}: {}".format(record['file'], label, record['mrv'], record['error'])
+    return "Failed {} {} mrv {} after {} with {} backtracks".format(
+        record['file'], label, record['mrv'], record['status'], record['backtracks'])
+
+
+# Totals per (engine, heuristics, mrv, level), keyed by a readable string for JSON
+def summarize(records):
+    summary = {}
+    for r in records:
+        key = "{} {} mrv {} {}".format(r['engine'], heuristics_label(r['heuristics']), r['mrv'], r['level'])
+        totals = summary.setdefault(key, {'puzzles': 0, 'solved': 0, 'seconds': 0.0,
+                                          'backtracks': 0, 'nodes': 0})
+        totals['puzzles'] += 1
+        totals['solved'] += r['status'] == 'solved'
+        totals['seconds'] += r['seconds']
+        totals['backtracks'] += r['backtracks']
+        totals['nodes'] += r['nodes']
+    return summary
+
+
+# Lists every group that got slower, needed more nodes, or solved fewer puzzles than
+# in the baseline. Times only count as regressions above min_seconds, to ignore noise.
+def regressions(summary, baseline, threshold, min_seconds=0.05):
+    found = []
+    for key, totals in sorted(summary.items()):
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if totals['solved'] < base['solved']:
+            found.append("{}: solved {} < {}".format(key, totals['solved'], base['solved']))
+        if totals['nodes'] > base['nodes'] * (1 + threshold):
+            found.append("{}: {} nodes > {}".format(key, totals['nodes'], base['nodes']))
+        slower = totals['seconds'] - base['seconds'] * (1 + threshold)
+        if slower > 0 and totals['seconds'] - base['seconds'] > min_seconds:
+            found.append("{}: {:.3f} sec > {:.3f} sec".format(key, totals['seconds'], base['seconds']))
+    return found
+
+
+def run(filenames, configs, max_backtracks, repeat=1, jobs=1, profile=False):
+    tasks = [(f, config, max_backtracks, repeat, profile) for config in configs for f in filenames]
+    records = []
+    with multiprocessing.Pool(jobs) as pool:
+        for record in pool.imap(run_one, tasks):
+            print(result_line(record))
+            records.append(record)
+    return records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('paths', nargs='*', default=['problems/'],
+                        help="puzzle files, directories or globs (default: problems/)")
+    parser.add_argument('--levels', default=','.join(main.LEVELS),
+                        help="difficulty levels to run, comma separated")
+    parser.add_argument('--engine', nargs='+', choices=sorted(sudoku.ENGINES), default=['tensor'])
+    parser.add_argument('--heuristic-levels', default=None,
+                        help="comma separated heuristic levels to sweep (default: all)")
+    parser.add_argument('--heuristics', action='append', default=None,
+                        help="comma separated heuristic names to sweep as one set; repeatable")
+    parser.add_argument('--mrv', choices=['on', 'off', 'both'], default='both')
+    parser.add_argument('--incremental', action='store_true', help="incremental tensor inference")
+    parser.add_argument('--max-backtracks', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=1, help="keep the fastest of N runs")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="worker processes; more than one makes timings noisier")
+    parser.add_argument('--profile', action='store_true',
+                        help="record per-heuristic counters for every solve (adds overhead)")
+    parser.add_argument('--output', default='bench.json', help="where to save the results")
+    parser.add_argument('--baseline', help="results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="allowed slowdown before a group counts as a regression")
+    args = parser.parse_args()
+
+    levels = args.levels.split(',')
+    try:
+        filenames = [f for f in main.puzzle_files(args.paths) if main.level_of(f) in levels]
+    except ValueError as e:
+        parser.error(str(e))
+    heuristic_sets = []
+    if args.heuristics:
+        heuristic_sets += [sudoku.select_heuristics(h.split(',')) for h in args.heuristics]
+    if args.heuristic_levels or not args.heuristics:
+        numbers = args.heuristic_levels.split(',') if args.heuristic_levels else range(len(sudoku.HEURISTICS))
+        heuristic_sets += [sudoku.heuristic_level(int(n)) for n in numbers]
+    mrv_settings = {'on': [True], 'off': [False], 'both': [True, False]}[args.mrv]
+    configs = list(configurations(args.engine, heuristic_sets, mrv_settings, args.incremental))
+
+    records = run(filenames, configs, args.max_backtracks, args.repeat, args.jobs, args.profile)
+    summary = summarize(records)
+    print()
+    for key, totals in sorted(summary.items()):
+        print("{}: solved {}/{} with {} backtracks, {} nodes in {:.2f} sec".format(
+            key, totals['solved'], totals['puzzles'], totals['backtracks'], totals['nodes'],
+            totals['seconds']))
+    with open(args.output, 'w') as f:
+        json.dump({'settings': vars(args), 'summary': summary, 'results': records}, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['summary']
+        found = regressions(summary, baseline, args.threshold)
+        print()
+        for line in found:
+            print("REGRESSION {}".format(line))
+        print("{} regressions against {}".format(len(found), args.baseline))
+        sys.exit(1 if found else 0)
@@ -0,0 +1,129 @@
+"""
+Streaming reader and writer for bulk puzzle files
+
+Bulk files hold one puzzle per line as 81 characters, row by row, with 1-9 for
+clues and 0 or . for empty squares. Blank lines and lines starting with # are
+skipped. Files are memory-mapped and parsed in chunks of lines, so a file with
+millions of puzzles is never read into memory all at once.
+"""
+import argparse
+import mmap
+import numpy as np
+import sudoku
+from solver import Solver
+
+CHUNK_LINES = 4096
+LINE_LENGTH = 81
+
+
+# Yields value grids with shape (N,9,9), 0 for empty squares, N <= chunk_lines
+def iter_grids(filename, chunk_lines=CHUNK_LINES):
+    with open(filename, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be memory-mapped
+            return
+        with data:
+            chunk_bytes = chunk_lines * (LINE_LENGTH + 1)
+            pos, line_number = 0, 1
+            while pos < len(data):
+                end = min(pos + chunk_bytes, len(data))
+                if end < len(data):
+                    # Only parse whole lines; the rest goes into the next chunk
+                    end = data.rfind(b'\n', pos, end) + 1
+                    if end == 0:
+                        raise ValueError("{}:{}: line too long".format(filename, line_number))
+                chunk = np.frombuffer(data[pos:end], dtype=np.uint8)
+                grids, num_lines = parse_lines(chunk, filename, line_number)
+                line_number += num_lines
+                pos = end
+                if len(grids):
+                    yield grids
+
+
+# Parses a chunk of whole lines. Returns the grids and the number of lines read.
+def parse_lines(buf, filename, line_number):
+    newlines = np.flatnonzero(buf == ord('\n'))
+    starts = np.concatenate(([0], newlines + 1))
+    stops = np.concatenate((newlines, [len(buf)]))
+    if stops[-1] == starts[-1]:
+        starts, stops = starts[:-1], stops[:-1]
+    # Allow \r\n line endings
+    crlf = (stops > starts) & (buf[np.maximum(stops - 1, 0)] == ord('\r'))
+    stops = stops - crlf
+    lengths = stops - starts
+    skipped = (lengths == 0) | (buf[np.minimum(starts, len(buf) - 1)] == ord('#'))
+    is_puzzle = (lengths == LINE_LENGTH) & ~skipped
+    bad = np.flatnonzero(~is_puzzle & ~skipped)
+    if len(bad):
+        raise ValueError("{}:{}: expected {} characters per puzzle".format(
+            filename, line_number + bad[0], LINE_LENGTH))
+    chars = buf[starts[is_puzzle, None] + np.arange(LINE_LENGTH)]
+    chars = np.where(chars == ord('.'), ord('0'), chars)
+    invalid = (chars < ord('0')) | (chars > ord('9'))
+    if invalid.any():
+        row = np.flatnonzero(is_puzzle)[invalid.any(axis=1).argmax()]
+        raise ValueError("{}:{}: puzzles may only contain 0-9 and .".format(
+            filename, line_number + row))
+    return (chars - ord('0')).reshape((-1, 9, 9)), len(starts)
+
+
+# Yields the (N,9,9,9) states of each chunk, ready for sudoku.propagate_batch
+def iter_states(filename, chunk_lines=CHUNK_LINES):
+    for grids in iter_grids(filename, chunk_lines):
+        yield sudoku.load_grids(grids)
+
+
+# Yields one board at a time, like sudoku.from_file for each line of a bulk file
+def iter_puzzles(filename, engine='tensor', chunk_lines=CHUNK_LINES, **options):
+    for states in iter_states(filename, chunk_lines):
+        for state in states:
+            yield sudoku.ENGINES[engine](state, **options)
+
+
+# Writes boards of either engine, or (9,9) value grids, one line each, CHUNK_LINES at
+# a time. Unsolved squares are written as 0; None is written as a line of dots.
+def write_puzzles(f, boards, chunk_lines=CHUNK_LINES):
+    chunk = []
+    for board in boards:
+        if board is None:
+            chunk.append(NO_SOLUTION)
+        elif isinstance(board, np.ndarray):
+            chunk.append(board.reshape(LINE_LENGTH) + ord('0'))
+        else:
+            chunk.append(sudoku.board_values(board).reshape(LINE_LENGTH) + ord('0'))
+        if len(chunk) == chunk_lines:
+            f.write(format_lines(chunk))
+            chunk = []
+    if chunk:
+        f.write(format_lines(chunk))
+
+
+NO_SOLUTION = np.full(LINE_LENGTH, ord('.'))
+
+
+def format_lines(chunk):
+    chars = np.array(chunk, dtype=np.uint8)
+    newline = np.full((len(chars), 1), ord('\n'), dtype=np.uint8)
+    return np.hstack((chars, newline)).tobytes()
+
+
+# Solves every puzzle in a bulk file, chunk by chunk: propagation runs over the whole
+# chunk at once and only the boards it cannot finish are searched one by one
+def solve_file(filename, output, engine='tensor', solver=None, chunk_lines=CHUNK_LINES):
+    solver = solver or Solver()
+    search = lambda board: solver.solve(board).solution
+    with open(output, 'wb') as f:
+        for states in iter_states(filename, chunk_lines):
+            write_puzzles(f, sudoku.solve_batch(states, search, engine), chunk_lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Solve a bulk file of 81-character puzzles")
+    parser.add_argument('puzzles', help="input file, one puzzle per line")
+    parser.add_argument('solutions', help="output file, one solution per line")
+    parser.add_argument('--engine', choices=sorted(sudoku.ENGINES), default='bitmask')
+    parser.add_argument('--max-backtracks', type=int, default=None)
+    args = parser.parse_args()
+    solve_file(args.puzzles, args.solutions, args.engine, Solver(max_backtracks=args.max_backtracks))
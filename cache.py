@@ -0,0 +1,251 @@
+"""
+A solution cache keyed on a canonical form of the puzzle
+
+Relabelling the digits, permuting rows within a band or columns within a stack,
+swapping bands or stacks, and transposing all turn a puzzle into an equivalent one
+whose solution is transformed the same way. The cache reduces every puzzle to a
+canonical form with one such transform, stores the solution of the canonical form,
+and maps it back through the inverse transform on a hit.
+
+The canonical form sorts rows, bands, columns and stacks by classes that describe how
+their clues relate, then picks the smallest grid among the orderings of rows and
+columns with equal classes. Highly symmetric puzzles can have more tied orderings
+than are compared, and may then be cached under more than one form. A hit is correct
+either way, because the stored solution is always mapped back through the transform
+that produced the key.
+
+Canonicalizing takes about 1-10 ms, more for puzzles with many tied orderings, so a
+hit on a transformed puzzle costs that much. Puzzles seen before exactly as given are
+looked up by their raw grid first and take microseconds.
+"""
+import itertools
+import os
+import time
+from collections import OrderedDict
+import numpy as np
+import sudoku
+from solver import SearchStats, SolveResult, SOLVED, NO_SOLUTION
+
+
+class Transform:
+    def __init__(self, transpose, rows, cols, digits):
+        self.transpose = transpose
+        # The new grid is grid[rows][:, cols], with value v replaced by digits[v]
+        self.rows = rows
+        self.cols = cols
+        self.digits = digits
+
+    def apply(self, grid):
+        if self.transpose:
+            grid = grid.T
+        return self.digits[grid[np.ix_(self.rows, self.cols)]]
+
+    def invert(self, grid):
+        inverse = np.zeros(10, dtype=grid.dtype)
+        inverse[self.digits] = np.arange(10)
+        original = np.empty_like(grid)
+        original[np.ix_(self.rows, self.cols)] = inverse[grid]
+        return original.T if self.transpose else original
+
+
+# Rounds of refining the row, column and digit classes, and the most candidate
+# orderings of rows and columns to compare when classes are still tied
+REFINE_ROUNDS = 3
+MAX_CANDIDATES = 64
+
+
+# Numbers each signature by its rank among the distinct signatures
+def rank(signatures):
+    ranks = {sig: i for i, sig in enumerate(sorted(set(signatures)))}
+    return [ranks[sig] for sig in signatures]
+
+
+# Splits rows, columns and digits into classes that do not depend on the order of
+# rows, columns or digits, only on how the clues relate to each other. Each round
+# describes every row by the classes of the columns and digits of its clues, grouped
+# by stack, and likewise for columns and digits, and renumbers the classes.
+def refine(grid):
+    clues = [(r, c, grid[r, c]) for r, c in zip(*np.nonzero(grid))]
+    rows, cols, digits = [0] * 9, [0] * 9, [0] * 10
+    for _ in range(REFINE_ROUNDS):
+        row_parts = [[[], [], []] for _ in range(9)]
+        col_parts = [[[], [], []] for _ in range(9)]
+        digit_parts = [[] for _ in range(10)]
+        for r, c, d in clues:
+            row_parts[r][c // 3].append((cols[c], digits[d]))
+            col_parts[c][r // 3].append((rows[r], digits[d]))
+            digit_parts[d].append((rows[r], cols[c]))
+        rows = rank([(rows[i], tuple(sorted(tuple(sorted(p)) for p in row_parts[i]))) for i in range(9)])
+        cols = rank([(cols[i], tuple(sorted(tuple(sorted(p)) for p in col_parts[i]))) for i in range(9)])
+        digits = rank([(digits[d], tuple(sorted(digit_parts[d]))) for d in range(10)])
+    return rows, cols
+
+
+# Yields orderings of 9 rows (or columns): bands sorted by the classes of their rows,
+# then rows within each band by class, with every ordering of tied bands or rows
+def orderings(classes):
+    bands = sorted(range(3), key=lambda b: (sorted(classes[3 * b:3 * b + 3]), b))
+    choices = []
+    for key, group in itertools.groupby(bands, key=lambda b: sorted(classes[3 * b:3 * b + 3])):
+        choices.append(list(itertools.permutations(group)))
+    for band_order in itertools.product(*choices):
+        band_order = [b for group in band_order for b in group]
+        row_choices = []
+        for b in band_order:
+            band = sorted(range(3 * b, 3 * b + 3), key=lambda r: classes[r])
+            row_choices.append([])
+            for _, group in itertools.groupby(band, key=lambda r: classes[r]):
+                row_choices[-1].append(list(itertools.permutations(group)))
+        for row_order in itertools.product(*[itertools.product(*c) for c in row_choices]):
+            yield [r for band in row_order for group in band for r in group]
+
+
+# Replaces digits in order of first appearance, reading row by row
+def relabel(grid):
+    digits = np.zeros(10, dtype=grid.dtype)
+    values = grid[grid > 0]
+    _, first = np.unique(values, return_index=True)
+    seen = values[np.sort(first)]
+    digits[seen] = np.arange(1, len(seen) + 1)
+    digits[np.setdiff1d(np.arange(1, 10), seen)] = np.arange(len(seen) + 1, 10)
+    return digits
+
+
+# Finds a transform that takes grid, a (9,9) array with 0 for empty squares, to its
+# canonical form: the smallest grid, read row by row, among the candidate orderings
+# of both orientations. Returns (canonical grid, transform).
+def canonicalize(grid):
+    best, best_key = None, None
+    for transpose in (False, True):
+        g = grid.T if transpose else grid
+        row_classes, col_classes = refine(g)
+        row_orders = list(itertools.islice(orderings(row_classes), MAX_CANDIDATES))
+        col_orders = list(itertools.islice(orderings(col_classes), MAX_CANDIDATES // len(row_orders) or 1))
+        for rows, cols in itertools.product(row_orders, col_orders):
+            rows, cols = np.array(rows), np.array(cols)
+            h = g[np.ix_(rows, cols)]
+            digits = relabel(h)
+            key = digits[h].tobytes()
+            if best_key is None or key < best_key:
+                best, best_key = Transform(transpose, rows, cols, digits), key
+    return best.apply(grid), best
+
+
+class SolutionCache:
+    # Maps canonical puzzles to canonical solutions (None for puzzles with no
+    # solution), keeping at most maxsize entries and evicting the least recently used.
+    # If path is given, entries are loaded from it and written back by save().
+    def __init__(self, maxsize=100000, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.entries = OrderedDict()
+        # Solutions of puzzles as they were given, so repeats skip canonicalize()
+        self.recent = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Returns (found, solution grid or None) for a (9,9) puzzle grid
+    def get(self, grid):
+        grid = np.asarray(grid, dtype=np.uint8)
+        given = grid.tobytes()
+        if given in self.recent:
+            self.hits += 1
+            self.recent.move_to_end(given)
+            return True, self.recent[given]
+        canonical, transform = canonicalize(grid)
+        key = canonical.tobytes()
+        if key not in self.entries:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        solution = self.entries[key]
+        if solution is not None:
+            solution = transform.invert(np.frombuffer(solution, dtype=np.uint8).reshape((9, 9)))
+        self.remember(given, solution)
+        return True, solution
+
+    def put(self, grid, solution):
+        grid = np.asarray(grid, dtype=np.uint8)
+        canonical, transform = canonicalize(grid)
+        key = canonical.tobytes()
+        if solution is not None:
+            solution = np.asarray(solution, dtype=np.uint8)
+            self.remember(grid.tobytes(), solution)
+            self.entries[key] = transform.apply(solution).tobytes()
+        else:
+            self.remember(grid.tobytes(), None)
+            self.entries[key] = None
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def remember(self, given, solution):
+        self.recent[given] = solution
+        self.recent.move_to_end(given)
+        while len(self.recent) > self.maxsize:
+            self.recent.popitem(last=False)
+
+    # The file holds one entry per line, least recently used first: the canonical
+    # puzzle and its solution as 81 digits each, or dots if there is no solution
+    def save(self, path=None):
+        path = path or self.path
+        with open(path + '.tmp', 'wb') as f:
+            for key, solution in self.entries.items():
+                f.write(to_digits(key) + b' ' + (b'.' * 81 if solution is None else to_digits(solution)) + b'\n')
+        os.replace(path + '.tmp', path)
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            for line in f:
+                puzzle, solution = line.split()
+                self.entries[from_digits(puzzle)] = None if solution.startswith(b'.') else from_digits(solution)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+# Entries are stored as 81 bytes holding the values 0-9; on disk they are digit characters
+def to_digits(entry):
+    return bytes(b + ord('0') for b in entry)
+
+
+def from_digits(text):
+    return bytes(c - ord('0') for c in text)
+
+
+class CachedSolver:
+    # Puts a SolutionCache in front of a solver with the same solve() interface.
+    # A hit returns at once with no nodes searched; only solves that finish, with a
+    # solution or a proof that there is none, are stored.
+    #
+    # The key is the grid of known values, or the clues if given as grid. Engines that
+    # propagate on construction may fill in the whole board; such boards are passed
+    # straight to the solver, as there is nothing left to search.
+    def __init__(self, solver, cache=None):
+        self.solver = solver
+        self.cache = cache if cache is not None else SolutionCache()
+
+    def solve(self, prob, grid=None):
+        start = time.monotonic()
+        grid = sudoku.board_values(prob) if grid is None else grid
+        if grid.all():
+            return self.solver.solve(prob)
+        found, solution = self.cache.get(grid)
+        if found:
+            stats = SearchStats()
+            stats.seconds = time.monotonic() - start
+            if solution is None:
+                return SolveResult(None, NO_SOLUTION, stats)
+            board = type(prob)(sudoku.load_grids(solution)[0], heuristics=prob.heuristics)
+            return SolveResult(board, SOLVED, stats)
+        result = self.solver.solve(prob)
+        if result.status == SOLVED:
+            self.cache.put(grid, sudoku.board_values(result.solution))
+        elif result.status == NO_SOLUTION:
+            self.cache.put(grid, None)
+        return result
@@ -0,0 +1,170 @@
+"""
+Solving Sudoku as an exact cover problem with Dancing Links (Knuth's Algorithm X)
+
+The rules that assign_idx enforces become 324 constraints on a 9x9 board, each of
+which must be met by exactly one assignment: every square holds one value (81
+columns), and every row, column and box holds each value once (3 x 81 columns). Each
+possible (y, x, value) assignment is a row of the matrix covering four of those
+columns. A board with N values has 4 N^2 columns in the same layout.
+"""
+import time
+from math import isqrt
+import numpy as np
+from solver import Solver, SearchAborted, SolveResult, SOLVED, NO_SOLUTION
+
+
+# The number of constraint columns for a board with size values
+def num_columns(size=9):
+    return 4 * size * size
+
+
+# The four constraint columns covered by assigning value idx+1 to square (y, x)
+def columns(y, x, idx, size=9):
+    side = isqrt(size)
+    box = (y // side) * side + x // side
+    n = size * size
+    return [y * size + x, n + y * size + idx, 2 * n + x * size + idx, 3 * n + box * size + idx]
+
+
+# A sparse 0/1 matrix as circular doubly-linked lists, stored in parallel arrays.
+# Node 0 is the root, nodes 1..num_columns are the column headers.
+class DancingLinks:
+    def __init__(self, num_columns, rows):
+        n = num_columns
+        self.L = [n] + list(range(n))
+        self.R = list(range(1, n + 1)) + [0]
+        self.U = list(range(n + 1))
+        self.D = list(range(n + 1))
+        self.C = list(range(n + 1))
+        self.S = [0] * (n + 1)
+        self.row_of = [None] * (n + 1)
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        for row, cols in enumerate(rows):
+            first = None
+            for c in cols:
+                c += 1
+                node = len(C)
+                L.append(node)
+                R.append(node)
+                U.append(U[c])
+                D.append(c)
+                C.append(c)
+                self.row_of.append(row)
+                D[U[c]] = node
+                U[c] = node
+                S[c] += 1
+                if first is None:
+                    first = node
+                else:
+                    L[node] = L[first]
+                    R[node] = first
+                    R[L[first]] = node
+                    L[first] = node
+
+    def cover(self, c):
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        R[L[c]] = R[c]
+        L[R[c]] = L[c]
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                D[U[j]] = D[j]
+                U[D[j]] = U[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def uncover(self, c):
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        i = U[c]
+        while i != c:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                D[U[j]] = j
+                U[D[j]] = j
+                j = L[j]
+            i = U[i]
+        R[L[c]] = c
+        L[R[c]] = c
+
+    # Picks the column with the fewest rows left, or None when every column is covered
+    def choose_column(self):
+        R, S = self.R, self.S
+        c = R[0]
+        if c == 0:
+            return None
+        best = c
+        while c != 0:
+            if S[c] < S[best]:
+                best = c
+                if S[c] <= 1:
+                    break
+            c = R[c]
+        return best
+
+
+class DLXSolver(Solver):
+    # Same solve() interface and budget settings as solver.Solver. The search counts
+    # one node per row tried and one backtrack per dead end; inference is not used.
+    def solve(self, prob):
+        stats = self.start(prob)
+        start = time.monotonic()
+        solution, status = None, NO_SOLUTION
+        try:
+            for solution in self.solutions(prob, stats):
+                status = SOLVED
+                break
+        except SearchAborted as e:
+            status = e.status
+        stats.seconds = time.monotonic() - start
+        return SolveResult(solution, status, stats)
+
+    # Yields each solution as a board of the same engine as prob
+    def solutions(self, prob, stats=None):
+        if stats is None:
+            stats = self.start(prob)
+        state = prob.state
+        size = len(state)
+        candidates = [tuple(a) for a in np.argwhere(state).tolist()]
+        links = DancingLinks(num_columns(size), [columns(y, x, idx, size) for y, x, idx in candidates])
+        for rows in self._search(links, [], stats):
+            yield to_board(prob, [candidates[r] for r in rows])
+
+    def _search(self, links, partial, stats):
+        c = links.choose_column()
+        if c is None:
+            yield list(partial)
+            return
+        if links.S[c] == 0:
+            self._backtrack(stats)
+            return
+        R, L, D, C = links.R, links.L, links.D, links.C
+        links.cover(c)
+        r = D[c]
+        while r != c:
+            self._visit(stats)
+            partial.append(links.row_of[r])
+            j = R[r]
+            while j != r:
+                links.cover(C[j])
+                j = R[j]
+            yield from self._search(links, partial, stats)
+            j = L[r]
+            while j != r:
+                links.uncover(C[j])
+                j = L[j]
+            partial.pop()
+            r = D[r]
+        links.uncover(c)
+        self._backtrack(stats)
+
+
+# Builds a board of the same engine as prob with the given assignments
+def to_board(prob, assignments):
+    size = prob.geometry.size
+    state = np.zeros((size, size, size), dtype=bool)
+    for y, x, idx in assignments:
+        state[y, x, idx] = True
+    return type(prob)(state, heuristics=prob.heuristics)
@@ -0,0 +1,152 @@
+"""
+Generating graded puzzles with a unique solution
+
+Each puzzle starts from a random full grid. Clues are removed in random order, and a
+removal is kept only if the puzzle still has a single solution: since the grid is one
+solution, it is enough to check that no solution has a different value in the square
+just emptied, which is one search that stops at the first solution it finds. Removal
+stops at a number of clues chosen for the level asked for, and the result is graded by
+the heuristics inference needs to solve it.
+
+    python generator.py puzzles.txt --count 1000
+    python generator.py 'puzzles_{level}.txt' --count 100 --levels hard,evil
+"""
+import argparse
+import itertools
+import multiprocessing
+import numpy as np
+import sudoku
+import bulk
+from main import LEVELS
+from solver import Solver
+
+# Removal stops at this many clues for each level; evil puzzles are made minimal
+LEVEL_CLUES = {'easy': 34, 'medium': 29, 'hard': 26, 'evil': 0}
+# Puzzles requested per level in each round of tasks sent to the pool, per worker
+TASKS_PER_JOB = 4
+
+search = Solver(single_square=True)
+
+
+# A random full grid: the diagonal boxes, which share no row or column, are filled
+# with random permutations and the rest is found by search
+def full_grid(rng):
+    grid = np.zeros((9, 9), dtype=np.uint8)
+    for b in range(3):
+        grid[3 * b:3 * b + 3, 3 * b:3 * b + 3] = (rng.permutation(9) + 1).reshape((3, 3))
+    board = search.solve(sudoku.BitmaskSudoku(sudoku.load_grids(grid)[0])).solution
+    return sudoku.board_values(board).astype(np.uint8)
+
+
+# True if the puzzle has a solution with something other than value at (y, x)
+def has_other_solution(puzzle, y, x, value):
+    state = sudoku.load_grids(puzzle)[0]
+    state[y, x, value - 1] = False
+    return search.solve(sudoku.BitmaskSudoku(state)).solved
+
+
+# Empties the squares of a full grid in random order, keeping the solution unique,
+# until min_clues are left or no more can be removed
+def remove_clues(grid, rng, min_clues=0):
+    puzzle = grid.copy()
+    clues = 81
+    for i in rng.permutation(81):
+        if clues <= min_clues:
+            break
+        y, x = divmod(int(i), 9)
+        puzzle[y, x] = 0
+        if has_other_solution(puzzle, y, x, grid[y, x]):
+            puzzle[y, x] = grid[y, x]
+        else:
+            clues -= 1
+    return puzzle
+
+
+# The lowest heuristic level at which inference solves the puzzle without search,
+# or None if it needs search
+def heuristics_needed(puzzle):
+    state = sudoku.load_grids(puzzle)[0]
+    for level in range(len(sudoku.HEURISTICS)):
+        board = sudoku.BitmaskSudoku(state, heuristics=sudoku.heuristic_level(level))
+        board.inference()
+        if board.is_solved():
+            return level
+    return None
+
+
+# Grades a puzzle as calibrated on problems/: easy puzzles fall to naked singles,
+# medium and hard ones also need hidden singles, hard ones with fewer than 28 clues,
+# and evil ones need pairs or more, or search. Returns (level, heuristic level
+# needed or None, backtracks of a search with every heuristic).
+def grade(puzzle):
+    needed = heuristics_needed(puzzle)
+    backtracks = 0
+    if needed is None:
+        backtracks = search.solve(sudoku.BitmaskSudoku(sudoku.load_grids(puzzle)[0])).stats.backtracks
+    if needed == 0:
+        level = 'easy'
+    elif needed == 1:
+        level = 'medium' if (puzzle > 0).sum() >= 28 else 'hard'
+    else:
+        level = 'evil'
+    return level, needed, backtracks
+
+
+# Makes one puzzle aimed at a level in a worker process. Returns (puzzle, grade).
+def generate_one(task):
+    seed, level = task
+    rng = np.random.default_rng(seed)
+    puzzle = remove_clues(full_grid(rng), rng, LEVEL_CLUES[level])
+    return puzzle, grade(puzzle)
+
+
+# Yields (puzzle, level) until count puzzles of each of levels have been made. Tasks
+# go to the pool in rounds aimed at the levels still short; puzzles that come out at
+# a level that is already full are dropped.
+def generate(count, levels=LEVELS, jobs=None, seed=0):
+    wanted = dict.fromkeys(levels, count)
+    seeds = itertools.count(seed)
+    jobs = jobs or multiprocessing.cpu_count()
+    with multiprocessing.Pool(jobs) as pool:
+        while any(wanted.values()):
+            tasks = [(next(seeds), level) for level in levels if wanted[level]
+                     for _ in range(min(wanted[level], jobs * TASKS_PER_JOB))]
+            for puzzle, (level, _, _) in pool.imap_unordered(generate_one, tasks):
+                if wanted.get(level):
+                    wanted[level] -= 1
+                    yield puzzle, level
+
+
+# Streams puzzles to bulk files; "{level}" in output is replaced by each level name,
+# otherwise every level goes to the same file
+def write(output, puzzles, levels=LEVELS, chunk_lines=bulk.CHUNK_LINES):
+    names = {level: output.format(level=level) for level in levels}
+    files = {name: open(name, 'wb') for name in set(names.values())}
+    chunks = {name: [] for name in files}
+    try:
+        for puzzle, level in puzzles:
+            chunk = chunks[names[level]]
+            chunk.append(puzzle)
+            if len(chunk) == chunk_lines:
+                bulk.write_puzzles(files[names[level]], chunk, chunk_lines)
+                chunk.clear()
+        for name, chunk in chunks.items():
+            bulk.write_puzzles(files[name], chunk, chunk_lines)
+    finally:
+        for f in files.values():
+            f.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('output', help="bulk file to write; {level} is replaced by the level name")
+    parser.add_argument('--count', type=int, default=100, help="puzzles per level")
+    parser.add_argument('--levels', default=','.join(LEVELS), help="levels to make, comma separated")
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--seed', type=int, default=0, help="puzzles are numbered from this random seed")
+    args = parser.parse_args()
+    levels = args.levels.split(',')
+    for level in levels:
+        if level not in LEVELS:
+            parser.error("unknown level {}; choose from {}".format(level, ', '.join(LEVELS)))
+    write(args.output, generate(args.count, levels, args.jobs, args.seed), levels)
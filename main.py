@@ -1,45 +1,238 @@
 """
 Solving Sudoku using Backtracking Search with Constraint Propagation
 """
-import sys
+import argparse
+import glob
+import multiprocessing
+import os
 import sudoku
+from solver import Solver, SearchAborted, BACKTRACK_LIMIT
+from dlx import DLXSolver
+from parallel import ParallelSolver
+from cache import CachedSolver, SolutionCache
 
-backtrack_count = 0
 MAX_BACKTRACK = 10
 
-def backtrack_search(prob, count=0):
-    global backtrack_count
-    prob.inference()
-    if prob.is_impossible():
-        backtrack_count += 1
-        if backtrack_count > MAX_BACKTRACK:
-            raise Exception("Too many backtracks")
-        return None
-    if prob.is_solved():
-        return prob
-    for y, x, val in prob.get_possible_actions():
-        result = backtrack_search(prob.take_action(y, x, val))
-        if result:
-            return result
-    backtrack_count += 1
-    if backtrack_count > MAX_BACKTRACK:
-        raise Exception("Too many backtracks")
-    return None
+
+# Returns the solved board, or None if there is no solution or the search gives up
+# after max_backtracks. Use solver.Solver directly for statistics and other budgets.
+def backtrack_search(prob, max_backtracks=MAX_BACKTRACK):
+    return Solver(max_backtracks=max_backtracks).solve(prob).solution
+
+
+# Same search, but on a single board changed in place: each branch is undone back
+# to a trail mark instead of copying the board. Returns prob holding the solution.
+def backtrack_search_inplace(prob, max_backtracks=MAX_BACKTRACK):
+    return Solver(max_backtracks=max_backtracks, inplace=True).solve(prob).solution
+
+
+# Yields every solution of prob, finding each only when the next one is asked for
+def solutions(prob):
+    return Solver().solutions(prob)
+
+
+# The number of solutions of prob, or limit if it has at least that many
+def count_solutions(prob, limit=None):
+    return Solver().count_solutions(prob, limit)
+
+
+# True if prob has exactly one solution
+def is_unique(prob):
+    return Solver().is_unique(prob)
+
+
+LEVELS = ['easy', 'medium', 'hard', 'evil']
+
+
+# Expands directories and glob patterns into a list of puzzle files. Raises
+# ValueError for a directory or pattern that matches no files.
+def puzzle_files(paths):
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = sorted(glob.glob(os.path.join(path, '*.txt')))
+        elif glob.has_magic(path):
+            matches = sorted(glob.glob(path))
+        else:
+            matches = [path]
+        if not matches:
+            raise ValueError("no puzzle files match {}".format(path))
+        filenames.extend(matches)
+    return filenames
+
+
+# Difficulty level of a puzzle, from file names like problems/hard_03.txt
+def level_of(filename):
+    level = os.path.basename(filename).split('_')[0]
+    return level if level in LEVELS else 'other'
+
+
+# Solves one puzzle file in a worker process. Returns (filename, SolveResult), or
+# (filename, error message) if the file could not be read or solved.
+def solve_file(task):
+    filename, engine, options, solver = task
+    try:
+        return filename, solver.solve(sudoku.from_file(filename, engine=engine, **options))
+    except Exception as e:
+        return filename, "{}: {}".format(type(e).__name__, e)
+
+
+# Prints one line per puzzle in the same format as results.txt
+def report(filename, result):
+    if isinstance(result, str):
+        print("Failed {}: {}".format(filename, result))
+        return
+    stats = result.stats
+    if result.solved:
+        print("Solved {} with {} backtracks in {:.2f} sec:".format(filename, stats.backtracks, stats.seconds))
+    elif result.status == BACKTRACK_LIMIT:
+        print("Failed {} after hitting limit of {} backtracks".format(filename, stats.backtracks))
+    else:
+        print("Failed {} ({}) after {} backtracks in {:.2f} sec".format(
+            filename, result.status, stats.backtracks, stats.seconds))
+
+
+# Solves many puzzle files across a process pool, printing each result as it finishes
+# followed by a summary per level. Returns the number of puzzles that were not solved.
+def run_batch(filenames, jobs=None, engine='tensor', options=None, solver=None):
+    solver = solver or Solver(max_backtracks=MAX_BACKTRACK)
+    tasks = [(f, engine, options or {}, solver) for f in filenames]
+    summary = {}
+    with multiprocessing.Pool(jobs) as pool:
+        for filename, result in pool.imap_unordered(solve_file, tasks):
+            report(filename, result)
+            stats = summary.setdefault(level_of(filename), [0, 0, 0, 0.0])
+            stats[0] += 1
+            if isinstance(result, str):
+                continue
+            stats[1] += result.solved
+            stats[2] += result.stats.backtracks
+            stats[3] += result.stats.seconds
+    print()
+    failures = 0
+    for level in LEVELS + ['other']:
+        if level in summary:
+            count, solved, backtracks, seconds = summary[level]
+            failures += count - solved
+            print("Level {}: solved {}/{} with {} backtracks in {:.2f} sec".format(
+                level, solved, count, backtracks, seconds))
+    return failures
 
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Usage: python {} puzzle.txt".format(sys.argv[0]))
-        print("  For example puzzle.txt files see problems/")
-        exit()
-    filename = sys.argv[1]
-    su = sudoku.from_file(filename)
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     epilog="For example puzzle.txt files see problems/")
+    parser.add_argument('paths', nargs='+', metavar='puzzle.txt',
+                        help="a puzzle file, or several files, directories or globs to solve in a batch")
+    parser.add_argument('--backend', choices=['search', 'dlx'], default='search',
+                        help="backtracking search with inference, or exact cover with Dancing Links")
+    parser.add_argument('--engine', choices=sorted(sudoku.ENGINES), default='tensor',
+                        help="board representation: NxNxN bool tensor or N-bit masks")
+    parser.add_argument('--size', type=int, default=9, choices=[4, 9, 16, 25],
+                        help="values per row, column and box; values above 9 are written A-P")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only re-check units touched since the last inference (tensor engine)")
+    parser.add_argument('--inplace', action='store_true',
+                        help="search on one board with an undo trail instead of copying per branch")
+    parser.add_argument('--heuristic-level', type=int, default=None,
+                        help="run the first N+1 of: " + ", ".join(sudoku.HEURISTICS) + " (default: all)")
+    parser.add_argument('--no-mrv', dest='mrv', action='store_false',
+                        help="branch on squares in order instead of fewest remaining values first")
+    parser.add_argument('--profile', action='store_true',
+                        help="print calls, time and eliminations per heuristic and search counts")
+    parser.add_argument('--parallel', action='store_true',
+                        help="search the subtrees of a single puzzle across --jobs processes")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="worker processes for batch runs or --parallel (default: one per core)")
+    parser.add_argument('--max-backtracks', type=int, default=None,
+                        help="give up on a puzzle after this many backtracks "
+                             "(default: {} for search, no limit for dlx)".format(MAX_BACKTRACK))
+    parser.add_argument('--max-nodes', type=int, default=None,
+                        help="give up on a puzzle after visiting this many search nodes")
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="give up on a puzzle after this many seconds")
+    parser.add_argument('--count', type=int, metavar='LIMIT', default=None,
+                        help="count the solutions of a single puzzle, stopping at LIMIT (0 for no limit)")
+    parser.add_argument('--cache', metavar='FILE', default=None,
+                        help="look up and store the solution in this cache file (single puzzle only)")
+    args = parser.parse_args()
+    if args.incremental and args.engine != 'tensor':
+        parser.error("--incremental requires --engine tensor")
+    if args.backend == 'dlx':
+        # Exact cover uses neither inference nor the branching order of the search
+        ignored = [flag for flag, used in [('--incremental', args.incremental), ('--inplace', args.inplace),
+                                           ('--heuristic-level', args.heuristic_level is not None),
+                                           ('--no-mrv', not args.mrv), ('--profile', args.profile),
+                                           ('--parallel', args.parallel)] if used]
+        if ignored:
+            parser.error("{} cannot be used with --backend dlx".format(', '.join(ignored)))
+    if args.count is not None and args.parallel:
+        parser.error("--count cannot be used with --parallel")
+    if args.cache and args.size != 9:
+        parser.error("--cache only stores 9x9 puzzles")
+    if args.heuristic_level is None:
+        args.heuristic_level = len(sudoku.HEURISTICS) - 1
+    options = {'heuristics': sudoku.heuristic_level(args.heuristic_level), 'size': args.size}
+    if args.incremental:
+        options['incremental'] = True
+    if args.max_backtracks is None and args.backend == 'search':
+        args.max_backtracks = MAX_BACKTRACK
+    settings = dict(max_backtracks=args.max_backtracks, max_nodes=args.max_nodes,
+                    timeout=args.timeout, inplace=args.inplace, mrv=args.mrv,
+                    profile=args.profile)
+    if args.backend == 'dlx':
+        solver = DLXSolver(**settings)
+    elif args.parallel:
+        solver = ParallelSolver(jobs=args.jobs, **settings)
+    else:
+        solver = Solver(**settings)
+    try:
+        filenames = puzzle_files(args.paths)
+    except ValueError as e:
+        parser.error(str(e))
+    if len(filenames) != 1 or filenames[0] != args.paths[0]:
+        if args.parallel:
+            parser.error("--parallel solves a single puzzle; batch runs already use --jobs processes")
+        if args.cache:
+            parser.error("--cache is only used for a single puzzle")
+        if args.count is not None:
+            parser.error("--count is only used for a single puzzle")
+        failures = run_batch(filenames, args.jobs, args.engine, options, solver)
+        exit(1 if failures else 0)
+    filename = filenames[0]
+    try:
+        su = sudoku.from_file(filename, engine=args.engine, **options)
+    except ValueError as e:
+        parser.error("{}: {}".format(filename, e))
     print("Original Problem:")
     print(su)
-    solution = backtrack_search(su)
-    if solution:
-        print("Solved {} with {} backtracks:".format(filename, backtrack_count))
-        print(solution)
+    if args.count is not None:
+        stats = solver.start(su)
+        try:
+            count = solver.count_solutions(su, args.count or None, stats)
+        except SearchAborted as e:
+            print("FAILURE: {} after {} backtracks".format(e.status.upper(), stats.backtracks))
+            exit(1)
+        print("{} has {}{} solutions ({} nodes, {} backtracks)".format(
+            filename, 'at least ' if count == args.count else '', count, stats.nodes, stats.backtracks))
+        exit(0)
+    if args.cache:
+        solver = CachedSolver(solver, SolutionCache(path=args.cache))
+    result = solver.solve(su)
+    if args.cache:
+        solver.cache.save()
+    if args.profile:
+        # Cache hits are not searched, so they have no profile
+        if result.stats.profile is not None:
+            print(result.stats.profile)
+        print("{} nodes, {} backtracks in {:.3f} sec".format(
+            result.stats.nodes, result.stats.backtracks, result.stats.seconds))
+    if result.solved:
+        print("Solved {} with {} backtracks:".format(filename, result.stats.backtracks))
+        print(result.solution)
+    elif result.status == BACKTRACK_LIMIT:
+        print("FAILURE: TOO MANY BACKTRACKS")
+        exit(1)
     else:
-        print("FAILURE: NO SOLUTION")
+        print("FAILURE: {}".format(result.status.upper()))
         exit(1)
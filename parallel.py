@@ -0,0 +1,130 @@
+"""
+Searching the subtrees of one puzzle in parallel across processes
+
+The top levels of the search tree are expanded in the parent process: each level
+branches on the values of one square with take_action. The resulting boards are
+handed one at a time to a pool of worker processes, so a worker that finishes a
+subtree early takes the next one from the queue. When any worker finds a solution,
+a shared event cancels the searches of the others.
+
+Subtrees are searched with Solver(single_square=True), branching on one square per
+node like the split, so no part of the tree is searched twice.
+"""
+import multiprocessing
+import time
+from solver import Solver, SearchAborted, SearchStats, SolveResult, SOLVED, NO_SOLUTION, TIMEOUT
+
+# Expand the tree until there are this many subtrees per worker, or it is this deep
+TASKS_PER_JOB = 8
+MAX_SPLIT_DEPTH = 4
+# Seconds between checks of the caller's cancel while waiting for the workers
+CANCEL_POLL = 0.05
+
+
+# The cancel event and solver of each worker process, set by init_worker
+worker = {}
+
+
+def init_worker(cancel, options):
+    worker['cancel'] = cancel
+    worker['options'] = options
+
+
+# Searches one subtree in a worker. The deadline is a time.time() value or None.
+def search_subtree(task):
+    board, deadline = task
+    timeout = None
+    if deadline is not None:
+        timeout = deadline - time.time()
+        if timeout <= 0:
+            return SolveResult(None, TIMEOUT, SearchStats())
+    solver = Solver(timeout=timeout, cancel=worker['cancel'], **worker['options'])
+    result = solver.solve(board)
+    if result.solved:
+        worker['cancel'].set()
+    return result
+
+
+class ParallelSolver(Solver):
+    # Same solve() interface and settings as solver.Solver, plus the number of worker
+    # processes (default: one per core). max_backtracks and max_nodes apply to each
+    # subtree; the node and backtrack counts returned are the totals over all of them.
+    def __init__(self, jobs=None, tasks_per_job=TASKS_PER_JOB, **options):
+        options['single_square'] = True
+        super().__init__(**options)
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.tasks_per_job = tasks_per_job
+
+    def solve(self, prob):
+        stats = self.start(prob)
+        start = time.monotonic()
+        try:
+            solution, subtrees = self.split(prob, stats)
+            if solution is None and subtrees:
+                solution, status = self.search_subtrees(subtrees, stats)
+            else:
+                status = SOLVED if solution else NO_SOLUTION
+        except SearchAborted as e:
+            solution, status = None, e.status
+        stats.seconds = time.monotonic() - start
+        return SolveResult(solution, status, stats)
+
+    # Expands the top of the tree. Returns (solution, None) if it is found on the way,
+    # otherwise (None, boards) with the roots of the subtrees left to search.
+    def split(self, prob, stats):
+        frontier = [prob]
+        for _ in range(MAX_SPLIT_DEPTH):
+            children = []
+            for board in frontier:
+                self._visit(stats)
+                board.inference()
+                if board.is_impossible():
+                    self._backtrack(stats)
+                    continue
+                if board.is_solved():
+                    return board, None
+                children.extend(board.take_action(y, x, val)
+                                for y, x, val in self._actions(board))
+            frontier = children
+            if len(frontier) >= self.jobs * self.tasks_per_job:
+                break
+        return None, frontier
+
+    # Searches the subtrees in a process pool. Returns (solution, status).
+    def search_subtrees(self, subtrees, stats):
+        deadline = None
+        if stats.deadline is not None:
+            deadline = time.time() + stats.deadline - time.monotonic()
+        options = {'max_backtracks': self.max_backtracks, 'max_nodes': self.max_nodes,
+                   'inplace': self.inplace, 'mrv': self.mrv, 'profile': self.profile,
+                   'single_square': True}
+        cancel = multiprocessing.Event()
+        solution, status = None, NO_SOLUTION
+        with multiprocessing.Pool(self.jobs, init_worker, (cancel, options)) as pool:
+            tasks = [(board, deadline) for board in subtrees]
+            results = pool.imap_unordered(search_subtree, tasks)
+            for _ in tasks:
+                result = self._next_result(results, cancel)
+                stats.nodes += result.stats.nodes
+                stats.backtracks += result.stats.backtracks
+                if stats.profile is not None and result.stats.profile is not None:
+                    stats.profile.add(result.stats.profile)
+                if result.solved and solution is None:
+                    solution, status = result.solution, SOLVED
+                    cancel.set()
+                elif result.status != NO_SOLUTION and status == NO_SOLUTION:
+                    # A subtree was cut short, so "no solution" cannot be claimed. Those
+                    # cancelled after the solution was found do not change the status.
+                    status = result.status
+        return solution, status
+
+    # Waits for the next subtree result, passing on a cancel from the caller to the
+    # workers while it waits
+    def _next_result(self, results, cancel):
+        while True:
+            if self.cancel is not None and self.cancel.is_set():
+                cancel.set()
+            try:
+                return results.next(timeout=CANCEL_POLL)
+            except multiprocessing.TimeoutError:
+                pass
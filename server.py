@@ -0,0 +1,304 @@
+"""
+A long-running solver service
+
+Keeps worker processes warm and answers puzzles over a localhost HTTP port or a
+Unix socket, so a solve does not pay for interpreter startup and imports:
+
+    python server.py --port 8080
+    curl --data-binary @problems/evil_28.txt 'localhost:8080/solve?timeout=2'
+
+    python server.py --unix /tmp/sudoku.sock
+    echo 000000010400000000020000000000050407008000300001090000300400200050100000000806000 | nc -U /tmp/sudoku.sock
+
+HTTP requests POST a puzzle to /solve, either in the format of problems/ or as 81
+characters with 0 or . for empty squares. On the Unix socket every line is a puzzle
+of 81 characters, optionally followed by a timeout in seconds, and replies come back
+one per line in the same order. Each reply is a JSON object with the status,
+solution, nodes, backtracks and seconds of the solve.
+
+Requests that arrive together are gathered into small batches, which run propagation
+over the whole batch at once in a worker process. Boards that propagation does not
+finish are then searched as separate tasks, spread over all the workers.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import math
+import os
+import time
+import urllib.parse
+import numpy as np
+import sudoku
+from solver import Solver, SearchStats, SolveResult, SOLVED, NO_SOLUTION, TIMEOUT
+
+BATCH_SIZE = 16
+BATCH_WAIT = 0.002
+DEFAULT_TIMEOUT = 10.0
+# Extra time the server waits for a worker past a request's deadline
+DEADLINE_SLACK = 0.1
+
+
+# Reads a puzzle in the format of problems/, or as one line of 81 characters with
+# 0 or . for empty squares. Returns a (9,9) grid, 0 for empty squares.
+def parse_puzzle(text):
+    text = text.strip()
+    if len(text) == 81 and '\n' not in text:
+        text = text.replace('.', '0')
+        if not all(sudoku.isdecimal(c) for c in text):
+            raise ValueError("puzzles may only contain 0-9 and .")
+        return np.array([int(c) for c in text]).reshape((9, 9))
+    rows = [list(sudoku.line_to_ints(line)) for line in sudoku.lines(text)]
+    if len(rows) != 9 or any(len(row) != 9 for row in rows):
+        raise ValueError("expected 9 rows of 9 digits, or one line of 81 characters")
+    return np.array(rows)
+
+
+# Settings of the solver in each worker process, set by init_worker
+worker = {}
+
+
+def init_worker(engine, options, max_backtracks):
+    worker['engine'] = sudoku.ENGINES[engine]
+    worker['options'] = options
+    worker['max_backtracks'] = max_backtracks
+
+
+def worker_ready():
+    return True
+
+
+# Runs propagation over a batch of grids in a worker process. Returns, for each grid,
+# the reply if propagation finished it, or its state if it still needs a search.
+def propagate_grids(grids):
+    start = time.monotonic()
+    states, status = sudoku.propagate_batch(sudoku.load_grids(grids))
+    stats = SearchStats()
+    stats.seconds = time.monotonic() - start
+    results = []
+    for state, code in zip(states, status):
+        if code == sudoku.IMPOSSIBLE:
+            results.append(reply(SolveResult(None, NO_SOLUTION, stats)))
+        elif code == sudoku.SOLVED:
+            results.append(reply(SolveResult(worker['engine'](state), SOLVED, stats)))
+        else:
+            results.append(state)
+    return results
+
+
+# Searches one board in a worker process, giving up at the deadline, a time.time()
+# value. Returns the reply.
+def search_state(state, deadline):
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        return reply(SolveResult(None, TIMEOUT, SearchStats()))
+    solver = Solver(max_backtracks=worker['max_backtracks'], timeout=remaining)
+    return reply(solver.solve(worker['engine'](state, **worker['options'])))
+
+
+# The fields main.py prints for a solve, with the solution as 81 digits
+def reply(result):
+    fields = result.as_dict()
+    fields.pop('profile', None)
+    fields['solution'] = None
+    if result.solved:
+        fields['solution'] = ''.join(str(v) for v in sudoku.board_values(result.solution).ravel())
+    return fields
+
+
+class Server:
+    # Queues puzzles from every connection and hands them to the pool in batches of
+    # up to batch_size, waiting at most batch_wait seconds for a batch to fill up
+    def __init__(self, pool, batch_size=BATCH_SIZE, batch_wait=BATCH_WAIT, timeout=DEFAULT_TIMEOUT):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.timeout = timeout
+        self.queue = asyncio.Queue()
+        self.dispatching = set()
+
+    # Solves one puzzle grid, giving up after timeout seconds. Returns a reply dict.
+    async def solve(self, grid, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((grid, time.time() + timeout, future))
+        try:
+            return await asyncio.wait_for(future, timeout + DEADLINE_SLACK)
+        except asyncio.TimeoutError:
+            stats = SearchStats()
+            stats.seconds = time.monotonic() - start
+            return reply(SolveResult(None, TIMEOUT, stats))
+
+    async def batch_requests(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            end = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), end - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.ensure_future(self.dispatch(batch))
+            self.dispatching.add(task)
+            task.add_done_callback(self.dispatching.discard)
+
+    # Propagates a batch in one worker, then searches each board it did not finish as a
+    # task of its own, so one slow puzzle holds up a single worker and no other request
+    async def dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.pool, propagate_grids, [grid for grid, _, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        searches = []
+        for (_, deadline, future), result in zip(batch, results):
+            if isinstance(result, np.ndarray):
+                searches.append(self.search(result, deadline, future))
+            else:
+                resolve(future, result)
+        await asyncio.gather(*searches)
+
+    async def search(self, state, deadline, future):
+        # Requests past their deadline have been cancelled by solve()
+        if future.done():
+            return
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.pool, search_state, state, deadline)
+        except Exception as e:
+            result = e
+        resolve(future, result)
+
+    # HTTP/1.1, one request per connection: POST /solve?timeout=SECONDS
+    async def handle_http(self, reader, writer):
+        try:
+            request = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line.strip() == b'':
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            if len(request) != 3:
+                code, fields = 400, {'error': "bad request line"}
+            else:
+                url = urllib.parse.urlsplit(request[1])
+                query = urllib.parse.parse_qs(url.query)
+                if url.path != '/solve':
+                    code, fields = 404, {'error': "not found"}
+                elif request[0] != 'POST':
+                    code, fields = 405, {'error': "use POST"}
+                else:
+                    code, fields = await self.handle(body.decode('latin-1'), query.get('timeout', [None])[0])
+            content = (json.dumps(fields) + '\n').encode()
+            writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\n"
+                         "Content-Length: {}\r\nConnection: close\r\n\r\n".format(
+                             code, HTTP_REASONS[code], len(content)).encode() + content)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    # One puzzle per line, replies in the same order; lines are solved concurrently
+    async def handle_lines(self, reader, writer):
+        replies = asyncio.Queue()
+
+        async def write_replies():
+            while True:
+                task = await replies.get()
+                if task is None:
+                    break
+                _, fields = await task
+                writer.write((json.dumps(fields) + '\n').encode())
+                await writer.drain()
+
+        writer_task = asyncio.ensure_future(write_replies())
+        try:
+            async for line in reader:
+                line = line.decode('latin-1').split()
+                if line:
+                    timeout = line[1] if len(line) > 1 else None
+                    await replies.put(asyncio.ensure_future(self.handle(line[0], timeout)))
+            await replies.put(None)
+            await writer_task
+        except ConnectionError:
+            writer_task.cancel()
+        finally:
+            writer.close()
+
+    # Returns (HTTP status code, reply dict) for a puzzle and an optional timeout string
+    async def handle(self, text, timeout=None):
+        try:
+            grid = parse_puzzle(text)
+            if timeout is not None:
+                timeout = float(timeout)
+                if not 0 < timeout < math.inf:
+                    raise ValueError("timeout must be a positive number of seconds")
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        return 200, await self.solve(grid, timeout)
+
+
+# Sets a reply, or an exception from the pool, unless the request has already timed out
+def resolve(future, result):
+    if future.done():
+        return
+    if isinstance(result, Exception):
+        future.set_exception(result)
+    else:
+        future.set_result(result)
+
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+async def serve(args, pool):
+    # Start every worker before accepting connections: workers forked later would
+    # inherit the open client sockets and keep them from closing
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*[loop.run_in_executor(pool, worker_ready) for _ in range(args.jobs)])
+    server = Server(pool, args.batch_size, args.batch_wait, args.timeout)
+    batcher = asyncio.ensure_future(server.batch_requests())
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle_lines, path=args.unix)
+        print("Listening on {}".format(args.unix))
+    else:
+        listener = await asyncio.start_server(server.handle_http, args.host, args.port)
+        print("Listening on http://{}:{}/solve".format(args.host, args.port))
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        batcher.cancel()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument('--port', type=int, default=8080, help="localhost HTTP port (default: 8080)")
+    where.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="worker processes (default: one per core)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--batch-wait', type=float, default=BATCH_WAIT,
+                        help="seconds to wait for a batch to fill up")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help="default deadline per request in seconds")
+    parser.add_argument('--engine', choices=sorted(sudoku.ENGINES), default='bitmask')
+    parser.add_argument('--heuristic-level', type=int, default=len(sudoku.HEURISTICS) - 1,
+                        help="run the first N+1 of: " + ", ".join(sudoku.HEURISTICS))
+    parser.add_argument('--max-backtracks', type=int, default=None)
+    args = parser.parse_args()
+    args.jobs = args.jobs or os.cpu_count()
+    options = {'heuristics': sudoku.heuristic_level(args.heuristic_level)}
+    with concurrent.futures.ProcessPoolExecutor(args.jobs, initializer=init_worker,
+                                                initargs=(args.engine, options, args.max_backtracks)) as pool:
+        try:
+            asyncio.run(serve(args, pool))
+        except KeyboardInterrupt:
+            pass
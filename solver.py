@@ -0,0 +1,243 @@
+"""
+Backtracking search with a budget and statistics kept per solve
+"""
+import time
+
+# Outcomes of a solve
+SOLVED = 'solved'
+NO_SOLUTION = 'no solution'
+BACKTRACK_LIMIT = 'backtrack limit'
+NODE_LIMIT = 'node limit'
+TIMEOUT = 'timeout'
+CANCELLED = 'cancelled'
+
+
+class SearchStats:
+    def __init__(self):
+        self.nodes = 0
+        self.backtracks = 0
+        self.seconds = 0.0
+        # Absolute time.monotonic() value after which the search gives up, if any
+        self.deadline = None
+        # Per-heuristic counters, when the solver was asked to profile
+        self.profile = None
+
+    def as_dict(self):
+        result = {'nodes': self.nodes, 'backtracks': self.backtracks, 'seconds': self.seconds}
+        if self.profile is not None:
+            result['profile'] = self.profile.as_dict()
+        return result
+
+
+# Counters for each heuristic run by inference(): how often it was called, the time
+# spent in it, how many candidates it eliminated, and how often it made progress
+class Profile:
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+        self.eliminated = {}
+        self.progress = {}
+
+    def record(self, name, seconds, eliminated):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.eliminated[name] = self.eliminated.get(name, 0) + eliminated
+        self.progress[name] = self.progress.get(name, 0) + (eliminated > 0)
+
+    # Runs heuristic(), using count_candidates() before and after to see what it did
+    def measure(self, name, heuristic, count_candidates):
+        before = count_candidates()
+        start = self.clock()
+        changed = heuristic()
+        seconds = self.clock() - start
+        self.record(name, seconds, before - count_candidates())
+        return changed
+
+    # Adds the counters of another profile, eg. from a search in another process
+    def add(self, other):
+        for name in other.calls:
+            self.calls[name] = self.calls.get(name, 0) + other.calls[name]
+            self.seconds[name] = self.seconds.get(name, 0.0) + other.seconds[name]
+            self.eliminated[name] = self.eliminated.get(name, 0) + other.eliminated[name]
+            self.progress[name] = self.progress.get(name, 0) + other.progress[name]
+
+    def as_dict(self):
+        return {name: {'calls': self.calls[name], 'seconds': self.seconds[name],
+                       'eliminated': self.eliminated[name], 'progress': self.progress[name]}
+                for name in self.calls}
+
+    def __str__(self):
+        lines = ["{:<16} {:>8} {:>9} {:>11} {:>9}".format(
+            'heuristic', 'calls', 'progress', 'eliminated', 'seconds')]
+        for name, counts in self.as_dict().items():
+            lines.append("{:<16} {:>8} {:>9} {:>11} {:>9.4f}".format(
+                name, counts['calls'], counts['progress'], counts['eliminated'], counts['seconds']))
+        return "\n".join(lines)
+
+
+class SolveResult:
+    def __init__(self, solution, status, stats):
+        self.solution = solution
+        self.status = status
+        self.stats = stats
+
+    @property
+    def solved(self):
+        return self.status == SOLVED
+
+    def __repr__(self):
+        return "SolveResult({}, nodes={}, backtracks={}, seconds={:.3f})".format(
+            self.status, self.stats.nodes, self.stats.backtracks, self.stats.seconds)
+
+    def as_dict(self):
+        result = {'status': self.status}
+        result.update(self.stats.as_dict())
+        return result
+
+
+# Raised inside the search when the budget runs out; solve() turns it into a status
+class SearchAborted(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+class Solver:
+    # A solver holds only its settings. Everything that changes during a solve lives in
+    # the SearchStats created by solve(), so one Solver can serve many solves, including
+    # solves running at the same time in different threads.
+    #   max_backtracks, max_nodes: give up after this many (None for no limit)
+    #   timeout: give up after this many seconds of wall-clock time
+    #   cancel: any object with an is_set() method, eg. a threading.Event, checked at
+    #       every node so another thread or process can stop the search
+    #   inplace: search on one board with an undo trail instead of copying per branch
+    #   mrv: try the squares with the fewest remaining values first
+    #   profile: collect per-heuristic counters into the stats of each solve
+    #   single_square: branch only on the values of the first square at each node.
+    #       Every solution has one of them, so the search stays complete, and no board
+    #       is visited twice, which the default of trying every square does not ensure.
+    def __init__(self, max_backtracks=None, max_nodes=None, timeout=None, cancel=None,
+                 inplace=False, mrv=True, profile=False, single_square=False):
+        self.max_backtracks = max_backtracks
+        self.max_nodes = max_nodes
+        self.timeout = timeout
+        self.cancel = cancel
+        self.inplace = inplace
+        self.mrv = mrv
+        self.profile = profile
+        self.single_square = single_square
+
+    def solve(self, prob):
+        stats = self.start(prob)
+        start = time.monotonic()
+        try:
+            if self.inplace:
+                solution = self._search_inplace(prob, stats)
+            else:
+                solution = self._search(prob, stats)
+            status = SOLVED if solution else NO_SOLUTION
+        except SearchAborted as e:
+            solution, status = None, e.status
+        stats.seconds = time.monotonic() - start
+        return SolveResult(solution, status, stats)
+
+    # The stats of a new solve of prob, with the deadline and profile set up
+    def start(self, prob):
+        stats = SearchStats()
+        if self.timeout is not None:
+            stats.deadline = time.monotonic() + self.timeout
+        if self.profile:
+            stats.profile = prob.profile = Profile()
+        return stats
+
+    # Yields every solution of prob as a separate board, searching only as far as
+    # needed for the next one. Inference prunes every node as in solve(), and each
+    # node branches on one square so no solution is found twice. A node counts as a
+    # backtrack once its branches run out, whether or not they held solutions, and
+    # max_backtracks applies to that count. Raises SearchAborted if the budget runs
+    # out; the counts are kept in stats if it is given.
+    def solutions(self, prob, stats=None):
+        if stats is None:
+            stats = self.start(prob)
+        yield from self._enumerate(prob, stats)
+
+    # Counts the solutions of prob, stopping once limit have been found
+    def count_solutions(self, prob, limit=None, stats=None):
+        count = 0
+        for _ in self.solutions(prob, stats):
+            count += 1
+            if count == limit:
+                break
+        return count
+
+    # True if prob has exactly one solution; stops searching at the second
+    def is_unique(self, prob, stats=None):
+        return self.count_solutions(prob, limit=2, stats=stats) == 1
+
+    def _search(self, prob, stats):
+        self._visit(stats)
+        prob.inference()
+        if prob.is_impossible():
+            self._backtrack(stats)
+            return None
+        if prob.is_solved():
+            return prob
+        for y, x, val in self._actions(prob):
+            result = self._search(prob.take_action(y, x, val), stats)
+            if result:
+                return result
+        self._backtrack(stats)
+        return None
+
+    def _search_inplace(self, prob, stats):
+        self._visit(stats)
+        prob.inference()
+        if prob.is_impossible():
+            self._backtrack(stats)
+            return None
+        if prob.is_solved():
+            return prob
+        for y, x, val in self._actions(prob):
+            mark = prob.mark()
+            prob.assign(y, x, val)
+            if self._search_inplace(prob, stats):
+                return prob
+            prob.undo(mark)
+        self._backtrack(stats)
+        return None
+
+    def _enumerate(self, prob, stats):
+        self._visit(stats)
+        prob.inference()
+        if prob.is_impossible():
+            self._backtrack(stats)
+            return
+        if prob.is_solved():
+            yield prob
+            return
+        for y, x, val in self._actions(prob, single_square=True):
+            yield from self._enumerate(prob.take_action(y, x, val), stats)
+        self._backtrack(stats)
+
+    def _actions(self, prob, single_square=False):
+        actions = prob.get_possible_actions(self.mrv)
+        if self.single_square or single_square:
+            y, x, _ = actions[0]
+            actions = [a for a in actions if a[:2] == (y, x)]
+        return actions
+
+    def _visit(self, stats):
+        stats.nodes += 1
+        if self.max_nodes is not None and stats.nodes > self.max_nodes:
+            raise SearchAborted(NODE_LIMIT)
+        if stats.deadline is not None and time.monotonic() > stats.deadline:
+            raise SearchAborted(TIMEOUT)
+        if self.cancel is not None and self.cancel.is_set():
+            raise SearchAborted(CANCELLED)
+
+    def _backtrack(self, stats):
+        stats.backtracks += 1
+        if self.max_backtracks is not None and stats.backtracks > self.max_backtracks:
+            raise SearchAborted(BACKTRACK_LIMIT)
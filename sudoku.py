@@ -1,13 +1,141 @@
 import numpy as np
-from functools import reduce
+from math import isqrt
+
+
+# Values in puzzle text: 0 for an empty square, then 1-9 and A-P for values 10-25
+SYMBOLS = '0123456789ABCDEFGHIJKLMNOP'
+# Lookup tables indexed by candidate mask are built for boards of up to this many
+# values; larger boards compute the same entries when they are looked up
+MASK_TABLE_SIZE = 16
+
+
+# Index tables for a board with size values, where size is the square of the box side,
+# eg. 9, 16 or 25. Squares are numbered row-major (y * size + x), and candidate masks
+# have bit idx set when value idx+1 is possible.
+class Geometry:
+    def __init__(self, size):
+        box = isqrt(size)
+        if box < 2 or box * box != size or size >= len(SYMBOLS):
+            raise ValueError("Board size must be 4, 9, 16 or 25, not {}".format(size))
+        self.size = size
+        self.box = box
+        self.squares = size * size
+        self.rows = [[y * size + x for x in range(size)] for y in range(size)]
+        self.cols = [[y * size + x for y in range(size)] for x in range(size)]
+        self.boxes = [[(by * box + dy) * size + bx * box + dx for dy in range(box) for dx in range(box)]
+                      for by in range(box) for bx in range(box)]
+        self.units = self.rows + self.cols + self.boxes
+        self.cell_units = [[] for _ in range(self.squares)]
+        for u, unit in enumerate(self.units):
+            for i in unit:
+                self.cell_units[i].append(u)
+        self.peers = [sorted(set(j for u in self.cell_units[i] for j in self.units[u]) - {i})
+                      for i in range(self.squares)]
+
+        # Lookup tables for candidate masks
+        self.all_digits = (1 << size) - 1
+        self.bit_values = 1 << np.arange(size)
+        if size <= MASK_TABLE_SIZE:
+            # Each entry extends the one for the mask without its lowest bit
+            self.popcount = [0]
+            self.mask_digits = [[]]
+            for m in range(1, 1 << size):
+                rest = m & (m - 1)
+                self.popcount.append(self.popcount[rest] + 1)
+                self.mask_digits.append([(m ^ rest).bit_length() - 1] + self.mask_digits[rest])
+            self.mask_bits = [[1 << idx for idx in digits] for digits in self.mask_digits]
+        else:
+            self.popcount = MaskTable(mask_popcount)
+            self.mask_digits = MaskTable(mask_digits)
+            self.mask_bits = MaskTable(mask_bits)
+
+        # The squares of each unit as an array
+        self.unit_index = np.array(self.units)
+
+
+# Stands in for a lookup table indexed by mask when the table would be too large
+class MaskTable:
+    def __init__(self, entry):
+        self.entry = entry
+
+    def __getitem__(self, mask):
+        return self.entry(mask)
+
+
+def mask_popcount(mask):
+    return bin(mask).count('1')
+
+
+def mask_digits(mask):
+    return [idx for idx in range(mask.bit_length()) if mask >> idx & 1]
+
+
+def mask_bits(mask):
+    return [1 << idx for idx in mask_digits(mask)]
+
+
+GEOMETRIES = {}
+
+
+# The tables for a board size, built the first time that size is used
+def geometry(size):
+    if size not in GEOMETRIES:
+        GEOMETRIES[size] = Geometry(size)
+    return GEOMETRIES[size]
+
+
+# Tables of the standard 9x9 board
+NINE = geometry(9)
+ROWS, COLS, BOXES, UNITS = NINE.rows, NINE.cols, NINE.boxes, NINE.units
+CELL_UNITS, PEERS = NINE.cell_units, NINE.peers
+ALL_DIGITS, BIT_VALUES = NINE.all_digits, NINE.bit_values
+POPCOUNT, MASK_DIGITS, MASK_BITS = NINE.popcount, NINE.mask_digits, NINE.mask_bits
+UNIT_INDEX = NINE.unit_index
+
+# The heuristics run by inference(), in order. heuristic_level N enables the first N+1.
+HEURISTICS = ['naked_singles', 'hidden_singles', 'naked_pairs', 'hidden_pairs',
+              'naked_triples', 'hidden_triples', 'naked_quads', 'hidden_quads',
+              'pointing', 'box_line', 'x_wing', 'swordfish']
+
+
+# Validates a collection of heuristic names and puts them in inference order.
+# None means all of them.
+def select_heuristics(heuristics=None):
+    if heuristics is None:
+        return list(HEURISTICS)
+    unknown = set(heuristics) - set(HEURISTICS)
+    if unknown:
+        raise ValueError("Unknown heuristics: {}".format(", ".join(sorted(unknown))))
+    return [name for name in HEURISTICS if name in heuristics]
+
+
+def heuristic_level(level):
+    return HEURISTICS[:level + 1]
+
 
 class Sudoku:
-    def __init__(self, state=None):
+    # The size of the board is taken from the state if one is given
+    def __init__(self, state=None, incremental=False, heuristics=None, size=9):
         if state is None:
             # Height, Width, Number of Digits
-            self.state = np.ones((9,9,9), dtype=bool)
+            self.state = np.ones((size, size, size), dtype=bool)
         else:
             self.state = state
+        self.geometry = geometry(len(self.state))
+        self.heuristics = select_heuristics(heuristics)
+        # Optional solver.Profile collecting per-heuristic counters
+        self.profile = None
+        # Log of removed candidates (flat indices into state) while searching in place
+        self.trail = None
+        # Set by incremental inference when a value has no place left in some unit,
+        # which leaves no square empty for is_impossible() to see
+        self.contradiction = False
+        self.incremental = incremental
+        if incremental:
+            # Work queues for incremental inference: units that need to be re-checked,
+            # and solved squares whose value has not yet been removed from their peers
+            self.dirty = dict.fromkeys(range(len(self.geometry.units)))
+            self.pending = np.flatnonzero(self.state.sum(axis=2) == 1).tolist()
 
     def __repr__(self):
         is_known = self.state.sum(axis=2) == 1
@@ -20,320 +148,733 @@ class Sudoku:
 
     def is_impossible(self):
         # If for any square no value is possible, the puzzle cannot be solved
-        return np.any(self.state.sum(axis=2) == 0)
+        return self.contradiction or np.any(self.state.sum(axis=2) == 0)
 
     def inference(self):
+        if self.incremental:
+            return self.inference_incremental()
         # If any heuristic changes something, go back and re-run all the heuristics
         while True:
-            if self.heuristic_naked_singles():
+            for name in self.heuristics:
+                if self.run_heuristic(name):
+                    break
+            else:
+                # Every heuristic is finished running: inference is done now
+                break
+
+    def run_heuristic(self, name):
+        heuristic = getattr(self, 'heuristic_' + name)
+        if self.profile is None:
+            return heuristic()
+        return self.profile.measure(name, heuristic, self.count_candidates)
+
+    def count_candidates(self):
+        return int(self.state.sum())
+
+    # Runs the same rules as inference(), but only on units that were touched since
+    # they were last checked, all of those units at once. Eliminations report their
+    # own changes, so nothing is rescanned or diffed against a copy of the state.
+    # Naked singles are always on: they are how the queued squares get propagated.
+    # Rules that look across units run on the whole board once the queues are empty.
+    def inference_incremental(self):
+        g = self.geometry
+        cells = self.state.reshape((g.squares, g.size))
+        profile = self.profile
+        while self.pending or self.dirty or self._board_rules(cells):
+            if self.pending:
+                start = profile and profile.clock()
+                i = self.pending.pop()
+                idx = cells[i].argmax()
+                peers = [j for j in g.peers[i] if cells[j, idx]]
+                for j in peers:
+                    if not self._eliminate(cells, j, [idx]):
+                        return
+                if profile:
+                    profile.record('naked_singles', profile.clock() - start, len(peers))
                 continue
-            if self.heuristic_hidden_singles():
+            units = list(self.dirty)
+            self.dirty.clear()
+            squares = g.unit_index[units]
+            groups = (cells[squares] * g.bit_values).sum(axis=2)
+            # Like inference(), stop at the first rule that changes anything
+            for name in self.heuristics:
+                if name not in UNIT_RULES:
+                    continue
+                start = profile and profile.clock()
+                find_removals, args = UNIT_RULES[name]
+                removals = find_removals(groups, *args)
+                if removals is None:
+                    # Some value has nowhere left to go in one of the units
+                    self.contradiction = True
+                    return
+                removals &= groups
+                found = np.nonzero(removals)
+                for i, bits in zip(squares[found].tolist(), removals[found].tolist()):
+                    if not self._eliminate(cells, i, g.mask_digits[bits]):
+                        return
+                if profile:
+                    profile.record(name, profile.clock() - start, int(popcounts(removals).sum()))
+                if len(found[0]):
+                    # The rules after this one have not checked these units yet
+                    self.dirty.update(dict.fromkeys(units))
+                    break
+
+    # Runs the enabled rules of BOARD_RULES until one removes something, queueing what
+    # it touched. Returns False if none did or the board has a contradiction.
+    def _board_rules(self, cells):
+        profile = self.profile
+        for name in self.heuristics:
+            if name not in BOARD_RULES:
                 continue
-            if self.heuristic_naked_pairs():
-                continue
-            if self.heuristic_hidden_pairs():
-                continue
-            if self.heuristic_naked_triples():
-                continue
-            if self.heuristic_hidden_triples():
-                continue
-            # Every heuristic is finished running: inference is done now
-            break
+            start = profile and profile.clock()
+            find_removals, arg = BOARD_RULES[name]
+            removals = find_removals(self.state, arg).reshape(cells.shape)
+            squares = np.flatnonzero(removals.any(axis=1)).tolist()
+            for i in squares:
+                if not self._eliminate(cells, i, np.flatnonzero(removals[i]).tolist()):
+                    return False
+            if profile:
+                profile.record(name, profile.clock() - start, int(removals.sum()))
+            if squares:
+                return True
+        return False
+
+    # Removes values from square i and queues the units and peers affected by it.
+    # Returns False if the square has no values left.
+    def _eliminate(self, cells, i, idxs):
+        idxs = [idx for idx in idxs if cells[i, idx]]
+        if not idxs:
+            return True
+        cells[i, idxs] = False
+        if self.trail is not None:
+            size = self.geometry.size
+            self.trail.append([i * size + idx for idx in idxs])
+        remaining = cells[i].sum()
+        if remaining == 0:
+            return False
+        if remaining == 1:
+            self.pending.append(i)
+        for u in self.geometry.cell_units[i]:
+            self.dirty[u] = None
+        return True
 
     def heuristic_naked_singles(self):
-        is_known = self.state.sum(axis=2) == 1
-        argmaxes = self.state.argmax(axis=2)
         old_state = self.state.copy()
-        for y, x in np.ndindex(9, 9):
-            if is_known[y, x]:
-                assign_idx(self.state, y, x, argmaxes[y,x])
+        self.state[...] = eliminate_solved(self.state[None])[0]
         # Return a nonzero value if this heuristic changed anything
-        return np.any(self.state != old_state)
+        return self._changed(old_state)
 
     def heuristic_hidden_singles(self):
         old_state = self.state.copy()
-        for idx in range(9):
-            for row in range(9):
-                if self.state[row, :, idx].sum() == 1:
-                    x = self.state[row, :, idx].argmax()
-                    assign_idx(self.state, row, x, idx)
-            for col in range(9):
-                if self.state[:, col, idx].sum() == 1:
-                    y = self.state[:, col, idx].argmax()
-                    assign_idx(self.state, y, col, idx)
-            for bx, by in np.ndindex(3, 3):
-                box = self.state[by*3:3+by*3, bx*3:3+bx*3, idx]
-                if box.sum() == 1:
-                    y = 3*by + box.argmax(axis=0).max()
-                    x = 3*bx + box.argmax(axis=1).max()
-                    assign_idx(self.state, y, x, idx)
+        states = assign_hidden_singles(self.state[None])
+        # Only the squares solved here lose their value from their peers: the values of
+        # squares that were already solved are left to naked singles
+        assigned = (states.sum(axis=3) == 1) & (old_state.sum(axis=2) > 1)
+        self.state[...] = eliminate_solved(states, assigned)[0]
         # Return a nonzero value if this heuristic changed anything
-        return np.any(self.state != old_state)
+        return self._changed(old_state)
 
     def heuristic_naked_pairs(self):
-        old_state = self.state.copy()
-        # Each "idx" is a number (ie. a possible value from 1 to 9)
-        for number_pair in pairs():
-            # Each row is a y-coordinate. Row 0 is at the top of the 9x9 grid
-            for row in range(9):
-                naked_pair(self.state[row, :], number_pair)
-            # Each column is an x-coordinate. Col 0 is on the left
-            for col in range(9):
-                naked_pair(self.state[:, col], number_pair)
-            # There are 9 boxes, each is 3x3 and contains 9 squares
-            for bx, by in np.ndindex(3, 3):
-                box = self.state[by*3:by*3 + 3, bx*3:bx*3 + 3].reshape((9,9))
-                result = naked_pair(box, number_pair)
-                self.state[by*3:by*3 + 3, bx*3:bx*3 + 3] = result.reshape((3,3,9))
-        return np.any(self.state != old_state)
+        return self.heuristic_subsets(2, hidden=False)
 
     def heuristic_hidden_pairs(self):
-        old_state = self.state.copy()
-        for number_pair in pairs():
-            for row in range(9):
-                hidden_pair(self.state[row, :], number_pair)
-            for col in range(9):
-                hidden_pair(self.state[:, col], number_pair)
-            for bx, by in np.ndindex(3, 3):
-                box = self.state[by*3:by*3 + 3, bx*3:bx*3 + 3].reshape((9,9))
-                result = hidden_pair(box, number_pair)
-                self.state[by*3:by*3 + 3, bx*3:bx*3 + 3] = result.reshape((3,3,9))
-        return np.any(self.state != old_state)
+        return self.heuristic_subsets(2, hidden=True)
 
     def heuristic_naked_triples(self):
-        old_state = self.state.copy()
-        for triple in range(9):
-            for partner in range(9):
-                for idx in range(9):
-                    if triple == partner: continue
-                    if idx == partner: continue
-                    if idx == triple : continue
-
-                    for row in range(9):
-                       
-                        cur_space     = self.state[row,idx]
-                        partner_space = self.state[row,partner]
-                        triple_space  = self.state[row,triple]
-
-                        if cur_space.sum() == 2 and partner_space.sum() == 2 and triple_space.sum() == 2:
-                            cur_space_indices     = [i for i, x in enumerate(cur_space) if x == True]
-                            partner_space_indices = [i for i, x in enumerate(partner_space) if x == True]
-                            triple_space_indices  = [i for i, x in enumerate(triple_space) if x == True]
-
-                            cp_intersect = np.intersect1d(cur_space_indices,partner_space_indices)
-                            pt_intersect = np.intersect1d(partner_space_indices,triple_space_indices)
-                            tc_intersect = np.intersect1d(triple_space_indices,cur_space_indices)
-
-                            union = reduce(np.union1d, (cp_intersect, pt_intersect, tc_intersect))
-
-                            if len(union) == 3:
-                                # remove the union numbers from the rest
-                                for rest in range(9):
-                                    if rest == idx or rest ==partner or rest == triple: continue
-                                    self.state[row,rest][union[0]] = False
-                                    self.state[row,rest][union[1]] = False
-                                    self.state[row,rest][union[2]] = False
-
-                    for col in range(9):
-                        cur_space     = self.state[idx,col]
-                        partner_space = self.state[partner, col]
-                        triple_space  = self.state[triple,  col]
-
-                        if cur_space.sum() == 2 and partner_space.sum() == 2 and triple_space.sum() == 2:
-                            cur_space_indices     = [i for i, x in enumerate(cur_space) if x == True]
-                            partner_space_indices = [i for i, x in enumerate(partner_space) if x == True]
-                            triple_space_indices  = [i for i, x in enumerate(triple_space) if x == True]
-
-                            cp_intersect = np.intersect1d(cur_space_indices,partner_space_indices)
-                            pt_intersect = np.intersect1d(partner_space_indices,triple_space_indices)
-                            tc_intersect = np.intersect1d(triple_space_indices,cur_space_indices)
-
-                            union = reduce(np.union1d, (cp_intersect, pt_intersect, tc_intersect))
-
-                            if len(union) == 3:
-                                # remove the union numbers from the rest
-                                for rest in range(9):
-                                    if rest == idx or rest ==partner or rest == triple: continue
-                                    self.state[rest ,col][union[0]] = False
-                                    self.state[rest ,col][union[1]] = False
-                                    self.state[rest ,col][union[2]] = False
-
-            
-                    for ix, iy in np.ndindex(3, 3):
-                        cur_box = self.state[iy*3:3+iy*3, ix*3:3+ix*3].reshape((9,9))
-                       
-                        cur_space     = cur_box[idx]
-                        partner_space = cur_box[partner]
-                        triple_space  = cur_box[triple]
-
-                        if cur_space.sum() == 2 and partner_space.sum() == 2 and triple_space.sum() == 2:
-                            cur_space_indices     = [i for i, x in enumerate(cur_space) if x == True]
-                            partner_space_indices = [i for i, x in enumerate(partner_space) if x == True]
-                            triple_space_indices  = [i for i, x in enumerate(triple_space) if x == True]
-
-                            cp_intersect = np.intersect1d(cur_space_indices,partner_space_indices)
-                            pt_intersect = np.intersect1d(partner_space_indices,triple_space_indices)
-                            tc_intersect = np.intersect1d(triple_space_indices,cur_space_indices)
-
-                            union = reduce(np.union1d, (cp_intersect, pt_intersect, tc_intersect))
-
-                            if len(union) == 3:
-                                # remove the union numbers from the rest
-                                for rest in range(9):
-                                    if rest == idx or rest ==partner or rest == triple: continue
-                                    cur_box[rest][union[0]] = False
-                                    cur_box[rest][union[1]] = False
-                                    cur_box[rest][union[2]] = False
-                        self.state[iy*3:3+iy*3, ix*3:3+ix*3] = cur_box.reshape((3,3,9))
-        return np.any(self.state != old_state)
+        return self.heuristic_subsets(3, hidden=False)
 
-    #TODO: refactor this into "hidden n"
     def heuristic_hidden_triples(self):
+        return self.heuristic_subsets(3, hidden=True)
+
+    def heuristic_naked_quads(self):
+        return self.heuristic_subsets(4, hidden=False)
+
+    def heuristic_hidden_quads(self):
+        return self.heuristic_subsets(4, hidden=True)
+
+    # Naked or hidden subsets of size k in all units at once, see subset_removals
+    def heuristic_subsets(self, k, hidden):
+        g = self.geometry
+        cells = self.state.reshape((g.squares, g.size))
+        removals = subset_removals((cells * g.bit_values).sum(axis=1), k, hidden)
+        if not removals.any():
+            return False
         old_state = self.state.copy()
-        for idx in range(9):
-            for row in range(9):
-                #get current box 
-                cur_space = self.state[row,idx]
-                cur_space_indices = [i for i, x in enumerate(cur_space) if x == True] 
-                #search all other spaces
-                for partner in range(9):
-                    if partner == idx: continue
-                    partner_space = self.state[row,partner]
-                    partner_space_indices = [i for i, x in enumerate(partner_space) if x == True] 
-
-                    #find the common numbers between two arbitrary spaces
-                    intersect = np.intersect1d(cur_space_indices,partner_space_indices)
-                    if len(intersect) == 3:
-                        
-                        break_partner = False
-                        for other in range(9):
-                            if other == idx: continue
-                            if other == partner: continue
-                        
-                            other_space = self.state[row,other]
-                            other_space_indices = [i for i, x in enumerate(other_space) if x == True] 
-                            #see if the common pair is unique
-                            other_intersect = np.intersect1d(intersect,other_space_indices)
-                            if (len(other_intersect) > 0):
-                                #if it is, quit your partner
-                                break_partner = True
-                                break
-
-                        #we java now
-                        if break_partner: break
-
-                        #actually apply the inference
-                        self.state[row,idx] = [True if np.isin(i,list(intersect)) else False for i in range(9) ]
-                        self.state[row,partner] = [True if np.isin(i,list(intersect)) else False for i in range(9) ]
-            for col in range(9):
-                #get current box 
-                cur_space = self.state[idx, col]
-                cur_space_indices = [i for i, x in enumerate(cur_space) if x == True] 
-                #search all other spaces
-                for partner in range(9):
-                    if partner == idx: continue
-                    partner_space = self.state[partner, col]
-                    partner_space_indices = [i for i, x in enumerate(partner_space) if x == True] 
-
-                    #find the common numbers between two arbitrary spaces
-                    intersect = np.intersect1d(cur_space_indices,partner_space_indices)
-                    if len(intersect) == 3:
-                        
-                        break_partner = False
-                        for other in range(9):
-                            if other == idx: continue
-                            if other == partner: continue
-                        
-                            other_space = self.state[idx,col] 
-                            other_space_indices = [i for i, x in enumerate(other_space) if x == True] 
-                            #see if the common pair is unique
-                            other_intersect = np.intersect1d(intersect,other_space_indices)
-                            if (len(other_intersect) > 0):
-                                #if it is, quit your partner
-                                break_partner = True
-                                break
-
-                        #we java now
-                        if break_partner: break
-
-                        #actually apply the inference
-                        self.state[idx, col ] = [True if np.isin(i,list(intersect)) else False for i in range(9) ]
-                        self.state[partner, col] = [True if np.isin(i,list(intersect)) else False for i in range(9) ]
-
-        for ix, iy in np.ndindex(3, 3):
-            cur_box = self.state[iy*3:3+iy*3, ix*3:3+ix*3].reshape((9,9))
-            for idx in range(9):
-                #get current box 
-                cur_space = cur_box[idx]
-                cur_space_indices = [i for i, x in enumerate(cur_space) if x == True] 
-                #search all other spaces
-                for partner in range(9):
-                    if partner == idx: continue
-                    partner_space = cur_box[partner]
-                    partner_space_indices = [i for i, x in enumerate(partner_space) if x == True] 
-
-                    #find the common numbers between two arbitrary spaces
-                    intersect = np.intersect1d(cur_space_indices,partner_space_indices)
-                    if len(intersect) == 3:
-                        
-                        break_partner = False
-                        for other in range(9):
-                            if other == idx: continue
-                            if other == partner: continue
-                        
-                            other_space = cur_box[other]
-                            other_space_indices = [i for i, x in enumerate(other_space) if x == True] 
-                            #see if the common pair is unique
-                            other_intersect = np.intersect1d(intersect,other_space_indices)
-                            if (len(other_intersect) > 0):
-                                #if it is, quit your partner
-                                break_partner = True
-                                break
-
-                        #we java now
-                        if break_partner: break
-
-                        #actually apply the inference
-                        cur_box[idx] = [True if np.isin(i,list(intersect)) else False for i in range(9) ]
-                        cur_box[partner] = [True if np.isin(i,list(intersect)) else False for i in range(9) ]
-            self.state[iy*3:3+iy*3, ix*3:3+ix*3] = cur_box.reshape((3,3,9))
+        cells &= (removals[:, None] & g.bit_values) == 0
+        return self._changed(old_state)
 
-        return np.any(self.state != old_state)
+    def heuristic_pointing(self):
+        return self.heuristic_board('pointing')
+
+    def heuristic_box_line(self):
+        return self.heuristic_board('box_line')
 
+    def heuristic_x_wing(self):
+        return self.heuristic_board('x_wing')
+
+    def heuristic_swordfish(self):
+        return self.heuristic_board('swordfish')
+
+    # A rule that looks across units, applied to the whole state, see BOARD_RULES
+    def heuristic_board(self, name):
+        find_removals, arg = BOARD_RULES[name]
+        removals = find_removals(self.state, arg)
+        if not removals.any():
+            return False
+        old_state = self.state.copy()
+        self.state &= ~removals
+        return self._changed(old_state)
+
+    # Every (y, x, value) of the unsolved squares in row-major order, sorted by the
+    # number of values left in the square when heuristic (MRV) is set
     def get_possible_actions(self, heuristic=True):
-        assignments = []
-        for y, x in np.ndindex(9,9):
-            if self.state[y, x].sum() > 1:
-                for idx in range(9):
-                    if self.state[y, x, idx]:
-                        value = idx + 1
-                        assignments.append((y, x, value))
-        def mrv(assignment):
-            y, x, _ = assignment
-            return self.state[y, x].sum()
+        counts = self.state.sum(axis=2)
+        ys, xs, idxs = np.nonzero(self.state & (counts > 1)[:, :, None])
+        assignments = list(zip(ys.tolist(), xs.tolist(), (idxs + 1).tolist()))
         if heuristic:
-            assignments.sort(key=mrv)
+            counts = counts.tolist()
+            assignments.sort(key=lambda a: counts[a[0]][a[1]])
         return assignments
-    
+
     def take_action(self, y, x, value):
+        g = self.geometry
         idx = value - 1
-        assert 1 <= value <= 9
+        assert 1 <= value <= g.size
         assert self.state[y, x, idx]
         new_state = self.state.copy()
+        if self.incremental:
+            other = Sudoku(new_state, heuristics=self.heuristics)
+            other.profile = self.profile
+            other.incremental = True
+            other.dirty = dict(self.dirty)
+            other.pending = list(self.pending)
+            others = [i for i in range(g.size) if i != idx]
+            other._eliminate(new_state.reshape((g.squares, g.size)), y * g.size + x, others)
+            return other
         assign_idx(new_state, y, x, idx)
-        return Sudoku(new_state)
+        other = Sudoku(new_state, heuristics=self.heuristics)
+        other.profile = self.profile
+        return other
+
+    # In-place alternative to take_action. Removals are logged on the trail, so
+    # undo(mark) can restore the board as it was when mark() was called.
+    def assign(self, y, x, value):
+        g = self.geometry
+        idx = value - 1
+        assert 1 <= value <= g.size
+        assert self.state[y, x, idx]
+        cells = self.state.reshape((g.squares, g.size))
+        i = y * g.size + x
+        if self.incremental:
+            self._eliminate(cells, i, [d for d in range(g.size) if d != idx])
+            return
+        removed = [j * g.size + idx for j in g.peers[i] if cells[j, idx]]
+        removed += [i * g.size + d for d in range(g.size) if d != idx and cells[i, d]]
+        self.state.flat[removed] = False
+        self.trail.append(removed)
+
+    def mark(self):
+        if self.trail is None:
+            self.trail = []
+        if self.incremental:
+            return len(self.trail), dict(self.dirty), list(self.pending), self.contradiction
+        return len(self.trail), None, None, False
+
+    def undo(self, mark):
+        length, dirty, pending, self.contradiction = mark
+        while len(self.trail) > length:
+            self.state.flat[self.trail.pop()] = True
+        if self.incremental:
+            self.dirty, self.pending = dirty, pending
+
+    # Returns True if the state changed since old_state, logging removals on the trail
+    def _changed(self, old_state):
+        if self.trail is None:
+            return np.any(self.state != old_state)
+        removed = np.flatnonzero(old_state & ~self.state)
+        if len(removed):
+            self.trail.append(removed)
+        return np.any(self.state != old_state)
+
+
+class BitmaskSudoku:
+    # Same interface as Sudoku, but each square is a candidate mask in a flat list.
+    # Solving a square immediately removes its value from all peers, so naked singles
+    # are propagated as they appear and the number of solved squares is kept up to date.
+    def __init__(self, state=None, heuristics=None, size=9):
+        if state is not None:
+            size = len(state) if isinstance(state, np.ndarray) else isqrt(len(state))
+        self.geometry = geometry(size)
+        self.heuristics = select_heuristics(heuristics)
+        self.profile = None
+        self.cells = [self.geometry.all_digits] * self.geometry.squares
+        self.solved = 0
+        self.contradiction = False
+        # Log of (square, old mask) pairs while searching in place
+        self.trail = None
+        if state is not None:
+            masks = state_to_masks(state) if isinstance(state, np.ndarray) else state
+            all_digits = self.geometry.all_digits
+            for i, mask in enumerate(masks):
+                self._remove(i, all_digits & ~mask)
+
+    @property
+    def state(self):
+        return masks_to_state(self.cells)
+
+    def __repr__(self):
+        g = self.geometry
+        values = [g.mask_digits[m][0] + 1 if g.popcount[m] == 1 else 0 for m in self.cells]
+        return str(np.array(values).reshape((g.size, g.size)))
+
+    def copy(self):
+        other = BitmaskSudoku.__new__(BitmaskSudoku)
+        other.geometry = self.geometry
+        other.heuristics = self.heuristics
+        other.profile = self.profile
+        other.cells = self.cells[:]
+        other.solved = self.solved
+        other.contradiction = self.contradiction
+        other.trail = None
+        return other
+
+    def is_solved(self):
+        return self.solved == self.geometry.squares and not self.contradiction
+
+    def is_impossible(self):
+        return self.contradiction
+
+    def inference(self):
+        # If any heuristic changes something, go back and re-run all the heuristics
+        while not self.contradiction:
+            for name in self.heuristics:
+                if self.run_heuristic(name):
+                    break
+            else:
+                break
+
+    def run_heuristic(self, name):
+        heuristic = getattr(self, 'heuristic_' + name)
+        if self.profile is None:
+            return heuristic()
+        return self.profile.measure(name, heuristic, self.count_candidates)
+
+    def count_candidates(self):
+        popcount = self.geometry.popcount
+        return sum(popcount[m] for m in self.cells)
+
+    # Removes candidate bits from square i, then removes the value of every square
+    # that becomes solved from its peers. Returns True if square i changed.
+    def _remove(self, i, bits):
+        cells = self.cells
+        if not cells[i] & bits:
+            return False
+        popcount, peers = self.geometry.popcount, self.geometry.peers
+        stack = [(i, bits)]
+        while stack:
+            i, bits = stack.pop()
+            old = cells[i]
+            new = old & ~bits
+            if new == old:
+                continue
+            cells[i] = new
+            if self.trail is not None:
+                self.trail.append((i, old))
+            self.solved += (popcount[new] == 1) - (popcount[old] == 1)
+            if new == 0:
+                self.contradiction = True
+                break
+            if popcount[new] == 1:
+                for j in peers[i]:
+                    if cells[j] & new:
+                        stack.append((j, new))
+        return True
+
+    def heuristic_naked_singles(self):
+        # Solved squares are propagated by _remove as soon as they appear, so this
+        # heuristic is always on whether or not it is selected
+        return False
+
+    def heuristic_hidden_singles(self):
+        cells = self.cells
+        g = self.geometry
+        changed = False
+        for unit in g.units:
+            once = twice = 0
+            for i in unit:
+                twice |= once & cells[i]
+                once |= cells[i]
+            if once != g.all_digits:
+                # Some value has nowhere left to go in this unit
+                self.contradiction = True
+                return True
+            for bit in g.mask_bits[once & ~twice]:
+                for i in unit:
+                    if cells[i] & bit:
+                        changed |= self._remove(i, cells[i] & ~bit)
+                        break
+            if self.contradiction:
+                return True
+        return changed
+
+    def heuristic_naked_pairs(self):
+        return self._apply_subsets(2, hidden=False)
+
+    def heuristic_hidden_pairs(self):
+        return self._apply_subsets(2, hidden=True)
+
+    def heuristic_naked_triples(self):
+        return self._apply_subsets(3, hidden=False)
 
+    def heuristic_hidden_triples(self):
+        return self._apply_subsets(3, hidden=True)
+
+    def heuristic_naked_quads(self):
+        return self._apply_subsets(4, hidden=False)
+
+    def heuristic_hidden_quads(self):
+        return self._apply_subsets(4, hidden=True)
+
+    # Naked or hidden subsets of size k in all units at once, see subset_removals
+    def _apply_subsets(self, k, hidden):
+        changed = False
+        for i, bits in enumerate(subset_removals(np.array(self.cells), k, hidden).tolist()):
+            if bits:
+                changed |= self._remove(i, bits)
+                if self.contradiction:
+                    return True
+        return changed
+
+    def heuristic_pointing(self):
+        return self._apply_board_rule('pointing')
+
+    def heuristic_box_line(self):
+        return self._apply_board_rule('box_line')
+
+    def heuristic_x_wing(self):
+        return self._apply_board_rule('x_wing')
+
+    def heuristic_swordfish(self):
+        return self._apply_board_rule('swordfish')
+
+    # Runs a rule of BOARD_RULES on the candidates as a state array
+    def _apply_board_rule(self, name):
+        find_removals, arg = BOARD_RULES[name]
+        changed = False
+        for i, bits in enumerate(state_to_masks(find_removals(self.state, arg))):
+            if bits:
+                changed |= self._remove(i, bits)
+                if self.contradiction:
+                    return True
+        return changed
+
+    def get_possible_actions(self, heuristic=True):
+        g = self.geometry
+        assignments = []
+        for i, mask in enumerate(self.cells):
+            if g.popcount[mask] > 1:
+                y, x = divmod(i, g.size)
+                for idx in g.mask_digits[mask]:
+                    assignments.append((y, x, idx + 1))
+        if heuristic:
+            assignments.sort(key=lambda a: g.popcount[self.cells[a[0] * g.size + a[1]]])
+        return assignments
+
+    def take_action(self, y, x, value):
+        g = self.geometry
+        idx = value - 1
+        assert 1 <= value <= g.size
+        assert self.cells[y * g.size + x] >> idx & 1
+        other = self.copy()
+        other._remove(y * g.size + x, g.all_digits & ~(1 << idx))
+        return other
+
+    # In-place alternative to take_action, undone with undo(mark)
+    def assign(self, y, x, value):
+        g = self.geometry
+        idx = value - 1
+        assert 1 <= value <= g.size
+        assert self.cells[y * g.size + x] >> idx & 1
+        self._remove(y * g.size + x, g.all_digits & ~(1 << idx))
+
+    def mark(self):
+        if self.trail is None:
+            self.trail = []
+        return len(self.trail), self.contradiction
+
+    def undo(self, mark):
+        length, self.contradiction = mark
+        cells, trail = self.cells, self.trail
+        popcount = self.geometry.popcount
+        while len(trail) > length:
+            i, old = trail.pop()
+            self.solved += (popcount[old] == 1) - (popcount[cells[i]] == 1)
+            cells[i] = old
+
+
+ENGINES = {
+    'tensor': Sudoku,
+    'bitmask': BitmaskSudoku,
+}
+
+
+# Converts a (size,size,size) boolean state to a list of candidate masks and back
+def state_to_masks(state):
+    size = len(state)
+    return (state.reshape((size * size, size)) * geometry(size).bit_values).sum(axis=1).tolist()
+
+
+def masks_to_state(masks):
+    size = isqrt(len(masks))
+    return (np.array(masks)[:, None] & geometry(size).bit_values != 0).reshape((size, size, size))
+
+
+# Finds values that fit in only one square of a group, on groups of candidate masks
+# with shape (G,size), eg. the units of a board. Those squares lose their other values;
+# a square that is the only place for two values loses all of them. Returns the bits
+# to remove from each member of each group, or None if some value has no place left
+# in a group.
+def hidden_singles(groups):
+    g = geometry(groups.shape[1])
+    counts = (groups[:, :, None] >> np.arange(g.size) & 1).sum(axis=1)
+    if (counts == 0).any():
+        return None
+    singles = ((counts == 1) * g.bit_values).sum(axis=1)[:, None]
+    hidden = groups & singles
+    several = popcounts(hidden) > 1
+    return np.where(several, groups, np.where(hidden != 0, groups & ~singles, 0))
+
+
+# Finds naked or hidden subsets of size k in every unit at once, given the candidate
+# masks of all squares. A naked subset is k squares of a unit that between them
+# allow only k values, so no other square in the unit can take those values. A hidden
+# subset is k values that fit in only k squares of a unit, so those squares can take
+# no other values. Both are the same search: for hidden subsets, each value gets a
+# mask of the positions it can take in the unit, and k of those masks are combined
+# instead of k squares. Returns the bits to remove from each square.
+def subset_removals(masks, k, hidden):
+    unit_index = geometry(isqrt(len(masks))).unit_index
+    removals = np.zeros(len(masks), dtype=int)
+    np.bitwise_or.at(removals, unit_index, group_subset_removals(masks[unit_index], k, hidden))
+    return removals & masks
+
+
+# The search of subset_removals on any groups of masks, with shape (G,size). Returns
+# the bits to remove from each member of each group.
+def group_subset_removals(groups, k, hidden):
+    g = geometry(groups.shape[1])
+    positions = np.arange(g.size)
+    if hidden:
+        # places[u, idx] has bit p set if square p of unit u can take value idx+1
+        bits = groups[:, :, None] >> positions & 1
+        groups = (bits << positions[:, None]).sum(axis=1)
+    # Members are squares (or values) with 2 to k candidates: solved ones only repeat
+    # what singles find. Picks grow one member at a time in order of position, and only
+    # those whose union still has at most k values are kept, so the work follows the
+    # candidates left rather than every way to pick k.
+    sizes = popcounts(groups)
+    is_open = (sizes >= 2) & (sizes <= k)
+    units, last = np.nonzero(is_open)
+    unions = groups[units, last]
+    picked = 1 << last
+    for _ in range(k - 1):
+        units, last_member, unions, picked = (np.repeat(a, g.size) for a in (units, last, unions, picked))
+        last = np.tile(positions, len(units) // g.size)
+        unions = unions | groups[units, last]
+        keep = (last > last_member) & is_open[units, last] & (popcounts(unions) <= k)
+        units, last, unions, picked = units[keep], last[keep], unions[keep], (picked | 1 << last)[keep]
+    found = popcounts(unions) == k
+    units, unions, picked = units[found], unions[found], picked[found]
+    if hidden:
+        # Squares where the values were found lose every other value
+        inside = unions[:, None] >> positions & 1 == 1
+        remove = np.where(inside, (g.all_digits & ~picked)[:, None], 0)
+    else:
+        # Squares outside the subset lose the values it takes
+        outside = picked[:, None] >> positions & 1 == 0
+        remove = np.where(outside, unions[:, None], 0)
+    removals = np.zeros(groups.shape, dtype=int)
+    np.bitwise_or.at(removals, units, remove)
+    return removals
+
+
+# The number of bits set in each of an array of masks of up to 32 bits
+def popcounts(masks):
+    masks = masks - (masks >> 1 & 0x55555555)
+    masks = (masks & 0x33333333) + (masks >> 2 & 0x33333333)
+    masks = (masks + (masks >> 4)) & 0x0f0f0f0f
+    return (masks * 0x01010101 & 0xffffffff) >> 24
+
+
+# Rules used by incremental inference on the units it re-checks, as (function,
+# arguments). Each takes the candidate masks of the units with shape (G,size).
+UNIT_RULES = {
+    'hidden_singles': (hidden_singles, ()),
+    'naked_pairs': (group_subset_removals, (2, False)),
+    'hidden_pairs': (group_subset_removals, (2, True)),
+    'naked_triples': (group_subset_removals, (3, False)),
+    'hidden_triples': (group_subset_removals, (3, True)),
+    'naked_quads': (group_subset_removals, (4, False)),
+    'hidden_quads': (group_subset_removals, (4, True)),
+}
+
+
+# Finds values confined to the intersection of a box and a row, for every box, row
+# and value at once. If the places a value can take in a box all lie in one row, the
+# value goes in that part of the row and leaves the rest of the row (pointing pairs
+# and triples). If its places in a row all lie in one box, it leaves the rest of the
+# box (box-line reduction). Columns are handled as the rows of the transposed state.
+# Returns the candidates to remove as a boolean array shaped like the state.
+def intersection_removals(state, pointing):
+    size = len(state)
+    box = geometry(size).box
+    removals = np.zeros_like(state)
+    for transpose in (False, True):
+        lines = state.transpose((1, 0, 2)) if transpose else state
+        # segments[by, dy, bx, idx]: value idx+1 can go in row box*by+dy of box (by, bx)
+        segments = lines.reshape((box, box, box, box, size)).any(axis=3)
+        # Pointing compares the rows of a box (axis 1), box-line the boxes of a row (axis 2)
+        within, across = (1, 2) if pointing else (2, 1)
+        confined = segments & (segments.sum(axis=within, keepdims=True) == 1)
+        # A segment loses the value if another segment of its row (or box) confines it
+        others = confined.sum(axis=across, keepdims=True) - confined
+        remove = np.broadcast_to((others > 0)[:, :, :, None], (box, box, box, box, size))
+        remove = remove.reshape((size, size, size))
+        removals |= remove.transpose((1, 0, 2)) if transpose else remove
+    return removals & state
+
+
+# Finds X-Wings (k=2) and Swordfish (k=3) for every value at once. If the places a
+# value can take in k rows lie in only k columns, those columns get the value in
+# those rows, and it leaves the rest of the columns; the same holds with rows and
+# columns swapped. Taking each value as a group of rows with a mask of columns per
+# row, these are naked subsets, found with group_subset_removals. Returns the
+# candidates to remove as a boolean array shaped like the state.
+def fish_removals(state, k):
+    bit_values = geometry(len(state)).bit_values
+    removals = np.zeros_like(state)
+    for transpose in (False, True):
+        lines = state.transpose((1, 0, 2)) if transpose else state
+        # places[idx, y] has bit x set if value idx+1 can go in square (y, x)
+        places = (lines.transpose((2, 0, 1)) * bit_values).sum(axis=2)
+        remove = group_subset_removals(places, k, hidden=False)
+        remove = (remove[:, :, None] & bit_values != 0).transpose((1, 2, 0))
+        removals |= remove.transpose((1, 0, 2)) if transpose else remove
+    return removals & state
+
+
+# Whole-board rules for each heuristic that looks across units, as (function, argument)
+BOARD_RULES = {
+    'pointing': (intersection_removals, True),
+    'box_line': (intersection_removals, False),
+    'x_wing': (fish_removals, 2),
+    'swordfish': (fish_removals, 3),
+}
+
+
+# Removes the value of every solved square from its row, column and box, on a stack
+# of boards with shape (N,size,size,size), or only those of the squares marked in
+# solved, with shape (N,size,size). Solved squares whose value is solved in a peer
+# as well lose it too, leaving them empty.
+def eliminate_solved(states, solved=None):
+    if solved is None:
+        solved = states.sum(axis=3) == 1
+    fixed = states & solved[..., None]
+    rows, cols, boxes = unit_counts(fixed)
+    # A solved square counts its own value once in each of its three units
+    taken = rows[:, :, None] + cols[:, None] + expand_boxes(boxes) - 3 * fixed > 0
+    return states & ~taken
+
+
+# Solves the squares that are the only place left for a value in some unit, on a stack
+# of boards. A square that is the only place for two values is left empty.
+def assign_hidden_singles(states):
+    rows, cols, boxes = unit_counts(states)
+    hidden = states & ((rows == 1)[:, :, None] | (cols == 1)[:, None] | expand_boxes(boxes == 1))
+    count = hidden.sum(axis=3, keepdims=True)
+    return np.where(count == 1, hidden, states & (count == 0))
+
+
+# Status codes for boards propagated by propagate_batch
+UNKNOWN, SOLVED, IMPOSSIBLE = 0, 1, -1
+
+
+# Runs naked and hidden singles on a stack of boards with shape (N,size,size,size) at
+# once. Boards leave the active batch as soon as they are solved, contradicted, or stop
+# changing. Returns the propagated states and a status code for each board.
+def propagate_batch(states):
+    states = np.array(states, dtype=bool)
+    status = np.full(len(states), UNKNOWN)
+    active = np.arange(len(states))
+    while len(active):
+        old = states[active]
+        new, bad = batch_singles(old)
+        changed = (new != old).any(axis=(1,2,3))
+        solved = ~bad & ~changed & (new.sum(axis=3) == 1).all(axis=(1,2))
+        states[active] = new
+        status[active[bad]] = IMPOSSIBLE
+        status[active[solved]] = SOLVED
+        active = active[changed & ~bad]
+    return states, status
+
+
+# One vectorized round of assign_idx-style eliminations followed by hidden singles.
+# Returns the new states and a flag for each board that is now contradicted.
+def batch_singles(states):
+    # Both steps leave a square empty when they find two values for it
+    states = assign_hidden_singles(eliminate_solved(states))
+    # Values only ever lose places, so one with none left is a contradiction
+    rows, cols, boxes = unit_counts(states)
+    bad = (rows == 0).any(axis=(1,2)) | (cols == 0).any(axis=(1,2)) | (boxes == 0).any(axis=(1,2))
+    bad |= (states.sum(axis=3) == 0).any(axis=(1,2))
+    return states, bad
+
+
+# Counts of each value per row, column and box, each with shape (N,size,size)
+def unit_counts(states):
+    size = states.shape[-1]
+    box = isqrt(size)
+    rows = states.sum(axis=2)
+    cols = states.sum(axis=1)
+    boxes = states.reshape((-1, box, box, box, box, size)).sum(axis=(2, 4)).reshape((-1, size, size))
+    return rows, cols, boxes
+
+
+# Broadcasts per-box values with shape (N,size,size) back onto squares
+def expand_boxes(boxes):
+    size = boxes.shape[-1]
+    box = isqrt(size)
+    boxes = boxes.reshape((-1, box, box, size))
+    return np.repeat(np.repeat(boxes, box, axis=1), box, axis=2)
+
+
+# Solves a stack of boards. Propagation runs vectorized over the whole stack and only
+# boards it cannot finish are passed one at a time to search (eg. main.backtrack_search).
+# Returns a list holding a board or None for each input; without a search function,
+# unfinished boards are returned as far as propagation got them.
+def solve_batch(states, search=None, engine='tensor'):
+    states, status = propagate_batch(states)
+    results = []
+    for state, code in zip(states, status):
+        if code == IMPOSSIBLE:
+            results.append(None)
+        elif code == SOLVED or search is None:
+            results.append(ENGINES[engine](state))
+        else:
+            results.append(search(ENGINES[engine](state)))
+    return results
 
 
 # Assigns a value and enforces the basic rules of Sudoku:
 # ie. the alldiff constraints for rows, columns, and boxes
 def assign_idx(state, y, x, idx):
+    box = geometry(len(state)).box
     # Enforce consistency of rows/columns
     state[y,:,idx] = 0
     state[:,x,idx] = 0
     # Enforce consistency of boxes
-    y0, x0 = (y // 3) * 3, (x // 3) * 3
-    state[y0:y0 + 3, x0:x0 + 3, idx] = 0
+    y0, x0 = (y // box) * box, (x // box) * box
+    state[y0:y0 + box, x0:x0 + box, idx] = 0
     # Remove alternatives to this value
     state[y,x,:] = 0
     # Set the selected value
@@ -341,71 +882,61 @@ def assign_idx(state, y, x, idx):
     return state
 
 
-# Count all the distinct pairs of elements one through nine
-def pairs():
-    for i in range(9):
-        for j in range(i + 1, 9):
-            yield np.array([i, j])
-
-
-# Given a group of 9 cells (row, column, or box) and two indices, is there a naked pair?
-def naked_pair(group, pair):
-    # For each cell
-    for i in range(9):
-        # If this cell can only be the given pair
-        if group[i][pair].all() and group[i].sum() == 2:
-            for j in range(i + 1, 9):
-                # And if another cell can only be the given pair
-                if all(group[j] == group[i]):
-                    # Other cells CANNOT contain the given pair of numbers
-                    group[:, pair] = False
-                    group[i, pair] = True
-                    group[j, pair] = True
-    return group
-
-
-# Given a group of 9 cells, does the given pair of numbers form a hidden pair?
-def hidden_pair(group, number_pair):
-    # Does each number occur only twice?
-    if all(s == 2 for s in group[:, number_pair].sum(0)):
-        # Does each number occur twice in the same place?
-        for cell_pair in pairs():
-            if all(group[cell_pair, number].all() for number in number_pair):
-                # Other numbers CANNOT occur in this pair of cells
-                group[cell_pair, :] = False
-                for i in cell_pair:
-                    for j in number_pair:
-                        group[i, j] = True
-    return group
-    
-
 # Loads example problems of the format at:
 # http://web.engr.oregonstate.edu/~tadepall/cs531/18/sudoku-problems.txt
-def from_file(filename):
-    state = load_txt(open(filename).read())
-    return Sudoku(state)
-
-
-def load_txt(text):
-    state = np.ones((9,9,9), dtype=bool)
-    for i, line in enumerate(lines(text)):
-        for j, val in enumerate(line_to_ints(line)):
+# Larger boards use the same format, with the letters of SYMBOLS for values above 9.
+def from_file(filename, engine='tensor', size=9, **options):
+    state = load_txt(open(filename).read(), size)
+    return ENGINES[engine](state, **options)
+
+
+# Raises ValueError unless the text has size rows of size values, so a puzzle is not
+# read as a board of another size
+def load_txt(text, size=9):
+    rows = [list(line_to_ints(line, size)) for line in lines(text, size)]
+    if len(rows) != size or any(len(row) != size for row in rows):
+        raise ValueError("expected {} rows of {} values".format(size, size))
+    state = np.ones((size, size, size), dtype=bool)
+    for i, row in enumerate(rows):
+        for j, val in enumerate(row):
             if val > 0:
                 assign_idx(state, i, j, val-1)
     return state
 
 
+# Vectorized load_txt for a stack of value grids with shape (N,size,size), 0 for empty
+# squares. Returns states with shape (N,size,size,size) with every clue removed from
+# its peers.
+def load_grids(grids, size=9):
+    grids = np.asarray(grids).reshape((-1, size, size))
+    clues = grids > 0
+    states = np.ones(grids.shape + (size,), dtype=bool)
+    states[clues] = grids[clues][:, None] == np.arange(1, size + 1)
+    return eliminate_solved(states, clues)
+
+
+# The values of a board of either engine as a (size,size) grid, 0 for unsolved squares
+def board_values(board):
+    state = board.state
+    return (state.argmax(axis=2) + 1) * (state.sum(axis=2) == 1)
+
+
 def isdecimal(c):
     return '0' <= c <= '9'
 
 
-def lines(text):
+# True if c stands for a value of a board with size values, or for an empty square
+def is_symbol(c, size=9):
+    return c in SYMBOLS[:size + 1]
+
+
+def lines(text, size=9):
     for line in text.splitlines():
-        if sum(isdecimal(c) for c in line) >= 9:
+        if sum(is_symbol(c, size) for c in line) >= size:
             yield line
 
 
-def line_to_ints(line):
+def line_to_ints(line, size=9):
     for char in line:
-        if isdecimal(char):
-            yield int(char)
+        if is_symbol(char, size):
+            yield SYMBOLS.index(char)